@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+AI 回复的持久化缓存（SQLite）
+
+- 放在 backend 目录下，重启不丢失，多个 gunicorn worker 共享
+- 过期时间(TTL) + 按最近访问时间的 LRU 淘汰，条数有上限
+- 同一个 key 同时未命中时只发一次上游请求：
+  进程内用锁合并，跨进程用 inflight 表里的租约合并。租约记录持有者，只能由持有者释放；
+  compute 期间每 lease_seconds/3 续租一次，流式生成再久也不会被别的 worker 抢走，
+  持有者进程退出后 lease_seconds 内过期
+- get_or_compute_async 是 ASGI 模式用的协程版本：SQLite 读写放到线程里，等待用 asyncio.sleep
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_cache.sqlite3')
+
+
+async def _in_thread(fn, *args):
+    """asyncio.to_thread 的替代（Python 3.9+ 才有）"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+class AICache:
+    def __init__(self, path=DEFAULT_PATH, ttl=7 * 24 * 3600, max_entries=5000,
+                 lease_seconds=45, poll_interval=0.2):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._key_locks = {}
+        self._key_locks_guard = threading.Lock()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                value TEXT NOT NULL,
+                                created REAL NOT NULL,
+                                accessed REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+            # 旧版本的租约表没有 owner 列；租约是临时数据，直接重建
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(inflight)")]
+            if columns and 'owner' not in columns:
+                conn.execute("DROP TABLE inflight")
+            conn.execute("""CREATE TABLE IF NOT EXISTS inflight (
+                                key TEXT PRIMARY KEY,
+                                owner TEXT NOT NULL,
+                                expires REAL NOT NULL)""")
+
+    def _conn(self):
+        """每个线程一个连接（sqlite3 连接不能跨线程共享）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(*parts):
+        raw = json.dumps(parts, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if now - created > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                     (key, value, now, now))
+        self._writes += 1
+        if self._writes % 50 == 0:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，并按最近访问时间裁剪到 max_entries 条"""
+        conn = self._conn()
+        conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        conn.execute("""DELETE FROM responses WHERE key IN (
+                            SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)""",
+                     (self.max_entries,))
+
+    def _acquire_lease(self, key):
+        """拿到租约时返回持有者标识，已被占用时返回 None"""
+        now = time.time()
+        owner = uuid.uuid4().hex
+        conn = self._conn()
+        conn.execute("DELETE FROM inflight WHERE key = ? AND expires < ?", (key, now))
+        try:
+            conn.execute("INSERT INTO inflight (key, owner, expires) VALUES (?, ?, ?)",
+                         (key, owner, now + self.lease_seconds))
+            return owner
+        except sqlite3.IntegrityError:
+            return None
+
+    def _renew_lease(self, key, owner):
+        self._conn().execute("UPDATE inflight SET expires = ? WHERE key = ? AND owner = ?",
+                             (time.time() + self.lease_seconds, key, owner))
+
+    def _release_lease(self, key, owner):
+        # 只删自己的：租约万一过期被别的 worker 拿走，不能把对方的删掉
+        self._conn().execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, owner))
+
+    def _compute_with_lease(self, key, owner, compute):
+        """持有租约期间执行 compute()，后台线程定期续租，结束后释放"""
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lease_seconds / 3):
+                self._renew_lease(key, owner)
+
+        threading.Thread(target=renew, name='ai-cache-lease', daemon=True).start()
+        try:
+            return compute()
+        finally:
+            stop.set()
+            self._release_lease(key, owner)
+
+    def is_inflight(self, key):
+        """是否有某个 worker 正在为该 key 请求上游"""
+        row = self._conn().execute("SELECT expires FROM inflight WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def _key_lock(self, key):
+        with self._key_locks_guard:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def get_or_compute(self, key, compute):
+        """命中直接返回；未命中时只有一个调用方执行 compute()，其余等待其结果。
+        compute() 返回 None 表示失败，不写入缓存。"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        lock = self._key_lock(key)
+        with lock:
+            try:
+                value = self.get(key)
+                if value is not None:
+                    return value
+
+                # 其他 worker 正在请求同一个 key 时，等它写入缓存（租约过期后自行请求）
+                owner = self._acquire_lease(key)
+                while owner is None:
+                    time.sleep(self.poll_interval)
+                    value = self.get(key)
+                    if value is not None:
+                        return value
+                    owner = self._acquire_lease(key)
+
+                def fetch():
+                    value = self.get(key)
+                    if value is not None:
+                        return value
+                    value = compute()
+                    if value is not None:
+                        self.set(key, value)
+                    return value
+                return self._compute_with_lease(key, owner, fetch)
+            finally:
+                with self._key_locks_guard:
+                    self._key_locks.pop(key, None)
+
+    async def get_or_compute_async(self, key, compute):
+        """get_or_compute 的协程版本，compute() 为协程。
+        进程内相同 key 的请求已经由 AsyncAIJobManager 合并成一个任务，这里只处理跨进程的租约。"""
+        value = await _in_thread(self.get, key)
+        if value is not None:
+            return value
+
+        owner = await _in_thread(self._acquire_lease, key)
+        while owner is None:
+            await asyncio.sleep(self.poll_interval)
+            value = await _in_thread(self.get, key)
+            if value is not None:
+                return value
+            owner = await _in_thread(self._acquire_lease, key)
+
+        async def renew():
+            while True:
+                await asyncio.sleep(self.lease_seconds / 3)
+                await _in_thread(self._renew_lease, key, owner)
+
+        renewer = asyncio.ensure_future(renew())
+        try:
+            value = await _in_thread(self.get, key)
+            if value is not None:
+                return value
+            value = await compute()
+            if value is not None:
+                await _in_thread(self.set, key, value)
+            return value
+        finally:
+            renewer.cancel()
+            await _in_thread(self._release_lease, key, owner)
+
+
+def create_ai_cache():
+    """按环境变量创建缓存
+
+    AI_CACHE_PATH         SQLite 文件路径，默认 backend/ai_cache.sqlite3
+    AI_CACHE_TTL          过期时间（秒），默认 7 天
+    AI_CACHE_MAX_ENTRIES  最多保留条数，默认 5000
+    """
+    return AICache(path=os.environ.get('AI_CACHE_PATH', DEFAULT_PATH),
+                   ttl=int(os.environ.get('AI_CACHE_TTL', 7 * 24 * 3600)),
+                   max_entries=int(os.environ.get('AI_CACHE_MAX_ENTRIES', 5000)))
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+AI 补充结果的后台任务
+
+/api/search 只返回本地结果和任务 id，AI 调用放到有界线程池里执行，
+前端通过轮询或 SSE 拿到逐步生成的内容，慢请求不会占住 gunicorn worker。
+ASGI 模式（asgi.py）用 AsyncAIJobManager：任务是事件循环里的协程，SSE 等待内容时不占线程。
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class AIJob:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = PENDING
+        self.chunks = []
+        self.content = None
+        self.created = time.time()
+        self.version = 0
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    def _update(self, **fields):
+        with self._cond:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._cond.notify_all()
+
+    def append(self, text):
+        """流式回调：追加模型刚生成的一段文字"""
+        with self._cond:
+            self.chunks.append(text)
+            self.status = RUNNING
+            self.version += 1
+            self._cond.notify_all()
+
+    def start(self):
+        self._update(status=RUNNING)
+
+    def finish(self, content):
+        self._update(status=DONE, content=content)
+
+    def fail(self):
+        self._update(status=FAILED)
+
+    def text(self):
+        """已完成时返回完整结果，否则返回目前生成的部分"""
+        if self.content is not None:
+            return self.content
+        return ''.join(self.chunks)
+
+    def wait(self, version, timeout):
+        """等待内容在 version 之后发生变化，返回最新 version"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != version or self.finished, timeout)
+            return self.version
+
+    def snapshot(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "content": self.text(),
+            "done": self.finished
+        }
+
+
+class AsyncAIJob(AIJob):
+    """事件循环里运行的任务：状态与 AIJob 相同，另外可以用 await wait_async() 等待变化"""
+
+    def __init__(self, job_id):
+        super().__init__(job_id)
+        self._changed = asyncio.Event()
+
+    def _wake(self):
+        # 每次变化换一个新的 Event，等待者拿到的是变化前的那个
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _update(self, **fields):
+        super()._update(**fields)
+        self._wake()
+
+    def append(self, text):
+        super().append(text)
+        self._wake()
+
+    async def wait_async(self, version, timeout):
+        if self.version == version and not self.finished:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.version
+
+
+class AIJobManager:
+    """有界线程池 + 内存中的任务表（相同 id 的任务只跑一次）"""
+    job_class = AIJob
+
+    def __init__(self, max_workers=4, max_pending=32, retention=600):
+        self.max_pending = max_pending
+        self.retention = retention
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._init_runner(max_workers)
+
+    def _init_runner(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-job')
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def _purge(self):
+        cutoff = time.time() - self.retention
+        for job_id in [k for k, j in self._jobs.items() if j.finished and j.created < cutoff]:
+            del self._jobs[job_id]
+
+    def submit(self, job_id, fn):
+        """提交任务 fn(job) -> 结果文本或 None；队列已满时返回 None"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != FAILED:
+                return job
+            pending = sum(1 for j in self._jobs.values() if not j.finished)
+            if pending >= self.max_pending:
+                print(f"AI任务队列已满 ({pending})，跳过本次AI补充")
+                return None
+            job = self._jobs[job_id] = self.job_class(job_id)
+        self._start(job, fn)
+        return job
+
+    def _start(self, job, fn):
+        self.executor.submit(self._run, job, fn)
+
+    @classmethod
+    def _run(cls, job, fn):
+        job.start()
+        try:
+            content = fn(job)
+        except Exception as e:
+            print(f"AI任务出错: {e}")
+            content = None
+        cls._finish(job, content)
+
+    @staticmethod
+    def _finish(job, content):
+        if content is None:
+            job.fail()
+        else:
+            job.finish(content)
+
+
+class AsyncAIJobManager(AIJobManager):
+    """事件循环版：fn(job) 为协程，同时运行的任务数用信号量限制；submit 只能在事件循环线程里调用"""
+    job_class = AsyncAIJob
+
+    def _init_runner(self, max_workers):
+        self._slots = asyncio.Semaphore(max_workers)
+        self._tasks = set()
+
+    def _start(self, job, fn):
+        task = asyncio.get_running_loop().create_task(self._run_async(job, fn))
+        # 保留引用，避免任务还没跑完就被垃圾回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_async(self, job, fn):
+        async with self._slots:
+            job.start()
+            try:
+                content = await fn(job)
+            except Exception as e:
+                print(f"AI任务出错: {e}")
+                content = None
+        self._finish(job, content)
@@ -1,13 +1,31 @@
 # -*- coding: utf-8 -*-
 import os
 import json
+import time
 import random
+import base64
+import hashlib
+import tempfile
+import threading
+from bisect import bisect_right
+from itertools import islice
+from datetime import date, datetime, timedelta
 import requests
-from datetime import datetime
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, abort, jsonify, request, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from lunar_python import Lunar, Solar
 from dotenv import load_dotenv
+from recipe_store import RecipeStore, default_recipe_paths, encode_json
+from search_index import SearchResultCache
+from facet_index import PlanSampler
+from ingredient_index import popcount
+from compact_store import RecipeView
+from calendar_cache import create_calendar
+from ai_cache import create_ai_cache
+from ai_jobs import AIJobManager
+from siliconflow_client import CircuitOpenError, create_client
+from metrics import create_metrics, instrument_app
+from static_assets import StaticAssets
 
 # 加载 .env 文件
 load_dotenv()
@@ -19,228 +37,594 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.dirname(BASE_DIR)
 frontend_dir = os.path.join(PARENT_DIR, 'frontend')
 
+# /static 由下面的 static_file 从内存返回（带指纹、预压缩），不用 Flask 默认的静态文件处理
 app = Flask(__name__,
-            static_folder=os.path.join(frontend_dir, 'static'),
+            static_folder=None,
             template_folder=frontend_dir)
 CORS(app)  # 开启跨域，确保手机能连上
 
-# --- 2. 数据库加载逻辑 (多路径兼容) ---
+class RecipeJSONProvider(DefaultJSONProvider):
+    """紧凑存储返回的是 RecipeView，序列化时转回普通 dict"""
+    @staticmethod
+    def default(o):
+        if isinstance(o, RecipeView):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+app.json = RecipeJSONProvider(app)
+
+# 监控指标：每个请求按路由计时，热点环节单独计时，见 /api/metrics
+METRICS = create_metrics()
+# PROFILE_SLOW_MS > 0 时按 PROFILE_SAMPLE_RATE 抽样做 cProfile，超过阈值的请求写到 PROFILE_DIR
+instrument_app(app, METRICS,
+               profile_slow_ms=float(os.environ.get('PROFILE_SLOW_MS', 0)),
+               profile_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.05)),
+               profile_dir=os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'recipe_app_profiles')))
+
+# --- 2. 数据库加载逻辑 (多路径兼容 + 热加载) ---
+# compile_recipes.py 生成的编译产物优先：直接 mmap，不解析 JSON、不建索引（RECIPES_ARTIFACT 可指定其他位置）；
+# 然后依次是 backend/recipes.json、backend/data/recipes.json、上级目录的 recipes.json
+RECIPE_PATHS = default_recipe_paths(BASE_DIR)
+# RECIPES_PATH 可以指定其他菜谱文件（例如 generate_recipes.py --count 100k 生成的压测数据）
+if os.environ.get('RECIPES_PATH'):
+    RECIPE_PATHS.insert(0, os.environ['RECIPES_PATH'])
+
+# RECIPES_COMPACT=memory/mmap 时使用紧凑列式存储（见 compact_store.py），默认直接用 json 解析结果
+STORE = RecipeStore(RECIPE_PATHS, compact=os.environ.get('RECIPES_COMPACT', ''))
+# RECIPES_RELOAD_INTERVAL 秒轮询一次文件变化，0 表示关闭；也可以给 worker 发 SIGHUP 触发重新加载
+RELOAD_INTERVAL = float(os.environ.get('RECIPES_RELOAD_INTERVAL', 5))
+
+def start_watching():
+    """在当前进程启动菜谱热加载（每个进程只生效一次）。
+    不在导入时启动：gunicorn --preload 时导入发生在 master 里，线程不会跟着 fork 到 worker。
+    gunicorn.conf.py 的 post_worker_init 在每个 worker 的主线程里调用（SIGHUP 只能在主线程注册），
+    其他启动方式由第一个请求兜底。"""
+    STORE.watch(RELOAD_INTERVAL)
+
+@app.before_request
+def ensure_watching():
+    start_watching()
+
 def load_recipes():
-    """多路径尝试加载 recipes.json"""
-    paths_to_try = [
-        os.path.join(BASE_DIR, 'recipes.json'),
-        os.path.join(BASE_DIR, 'data', 'recipes.json'),
-        os.path.join(PARENT_DIR, 'recipes.json')
-    ]
-    for path in paths_to_try:
-        if os.path.exists(path):
-            try:
-                with open(path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                print(f"读取 {path} 出错: {e}")
-    return []
-
-RECIPES = load_recipes()
+    """当前快照里的菜谱列表"""
+    return STORE.current().recipes
 
 # --- 3. 农历与季节逻辑 ---
+# 农历信息按用户时区的本地日期缓存，请求路径上不再调用 lunar_python
+CALENDAR = create_calendar()
+
+def lunar_info_for(day=None):
+    """某天的农历信息（按日期缓存），记录耗时和缓存命中"""
+    with METRICS.timer('lunar'):
+        METRICS.cache('calendar', CALENDAR.is_cached(day))
+        return CALENDAR.lunar_info(day)
+
 def get_lunar_info():
-    """获取农历信息，增加完善的错误保护"""
-    try:
-        today = datetime.now()
-        solar = Solar.fromDate(today)
-        lunar = Lunar.fromSolar(solar)
-
-        # 处理节日列表，防止返回 None 导致合并报错
-        festivals = lunar.getFestivals() or []
-        other_festivals = lunar.getOtherFestivals() or []
-
-        return {
-            "lunar_date": f"{lunar.getMonthInChinese()}月{lunar.getDayInChinese()}",
-            "festival": festivals + other_festivals,
-            "solar_term": lunar.getJieQi() or "",
-            "year": lunar.getYearInGanZhi(),
-            "month": lunar.getMonth(),
-            "day": lunar.getDay()
-        }
-    except Exception as e:
-        print(f"农历转换出错: {e}")
-        return {"lunar_date": "加载中", "festival": [], "solar_term": ""}
+    """获取今天的农历信息（按日期缓存）"""
+    return lunar_info_for()
 
 def get_season():
-    month = datetime.now().month
-    if month in [3, 4, 5]: return "春季"
-    elif month in [6, 7, 8]: return "夏季"
-    elif month in [9, 10, 11]: return "秋季"
-    else: return "冬季"
+    return CALENDAR.season()
 
 # --- 4. 推荐核心逻辑 ---
-def recommend_recipes(diet_type="中餐", meal_time="午餐"):
-    lunar_info = get_lunar_info()
-    season = get_season()
-
-    # 基础筛选
-    filtered = [r for r in RECIPES if r.get('category') == diet_type and meal_time in r.get('meal_type', [])]
-    if not filtered: return []
-
-    recommended = []
-    # 节日优先
-    if lunar_info['festival']:
-        for f in lunar_info['festival']:
-            recommended.extend([r for r in filtered if r.get('festival') and f in r.get('festival')])
-
-    # 时令优先
-    seasonal_pool = [r for r in filtered if season in r.get('season', '全年') and r not in recommended]
-    random.shuffle(seasonal_pool)
-
-    # 设定推荐数量
-    limit = 7 if diet_type == "中餐" else 4
-    recommended.extend(seasonal_pool[:limit - len(recommended)])
-
-    # 兜底：如果还没够，随机补齐
-    if len(recommended) < limit:
-        others = [r for r in filtered if r not in recommended]
-        random.shuffle(others)
-        recommended.extend(others[:limit - len(recommended)])
-
-    return recommended[:limit]
+def meal_limit(diet_type):
+    """每餐推荐数量"""
+    return 7 if diet_type == "中餐" else 4
+
+def recommend_recipe_ids(diet_type, meal_time, snapshot, day=None, rng=random):
+    """返回推荐菜谱在快照中的下标"""
+    lunar_info = lunar_info_for(day)
+    season = CALENDAR.season(day)
+
+    # 在 (类别, 餐次) 分面内按 节日 -> 时令 -> 随机补齐 抽样
+    with METRICS.timer('recommend'):
+        return snapshot.facet_index.recommend_ids(diet_type, meal_time, lunar_info['festival'], season,
+                                                  meal_limit(diet_type), rng)
+
+def recommend_recipes(diet_type="中餐", meal_time="午餐", snapshot=None):
+    snapshot = snapshot or STORE.current()
+    return [snapshot.recipes[i] for i in recommend_recipe_ids(diet_type, meal_time, snapshot)]
+
+MEALS = (("breakfast", "早餐"), ("dinner", "晚餐"), ("lunch", "午餐"))  # 按键名排序，与 jsonify 一致
+
+def encode_menu(snapshot, day, lunar_info, meals):
+    """一天菜单的 JSON 字节：每道菜用快照里预编码的 JSON 片段，不再逐个重新序列化"""
+    parts = [b'{"date":', encode_json(day.strftime("%Y年%m月%d日")),
+             b',"lunar":', encode_json(lunar_info),
+             b',"recommendations":{']
+    for i, (key, ids) in enumerate(meals):
+        parts += [b',' if i else b'', b'"', key.encode(), b'":[',
+                  b','.join(snapshot.fragment(idx) for idx in ids), b']']
+    parts += [b'},"season":', encode_json(CALENDAR.season(day)), b'}']
+    return b''.join(parts)
+
+def build_today_payload(diet_type, snapshot, now, rng=random):
+    """拼装 /api/today 的响应字节"""
+    day = now.date()
+    lunar_info = lunar_info_for(day)
+    meals = [(key, recommend_recipe_ids(diet_type, meal_time, snapshot, day, rng)) for key, meal_time in MEALS]
+    with METRICS.timer('encode'):
+        return encode_menu(snapshot, day, lunar_info, meals)
+
+# 多天菜单：农历一次性批量算好，每个分面的候选池整份计划只洗牌一次，计划内尽量不重复
+PLAN_MAX_DAYS = 31
+
+def build_plan_payload(diet_type, snapshot, start, days, rng=random):
+    """拼装 /api/plan 的响应字节：days 数组里每一项与 /api/today 的结构相同"""
+    with METRICS.timer('lunar'):
+        METRICS.cache('calendar', all(CALENDAR.is_cached(start + timedelta(days=i)) for i in range(days)))
+        lunar_days = CALENDAR.lunar_range(start, days)
+
+    sampler = PlanSampler(snapshot.facet_index, rng)
+    limit = meal_limit(diet_type)
+    menus = []
+    with METRICS.timer('recommend'):
+        for i, lunar_info in enumerate(lunar_days):
+            day = start + timedelta(days=i)
+            season = CALENDAR.season(day)
+            meals = [(key, sampler.pick(diet_type, meal_time, lunar_info['festival'], season, limit))
+                     for key, meal_time in MEALS]
+            menus.append((day, lunar_info, meals))
+
+    with METRICS.timer('encode'):
+        return b''.join([b'{"days":[',
+                         b','.join(encode_menu(snapshot, day, lunar_info, meals) for day, lunar_info, meals in menus),
+                         b'],"diet_type":', encode_json(diet_type),
+                         b',"start":', encode_json(start.isoformat()), b'}'])
+
+# "稳定每日菜单"：同一天同一饮食类型的菜单只生成一次（按日期播种随机数，所有 worker 结果一致），
+# 缓存响应字节并支持 ETag / 304，浏览器和 CDN 可以一直缓存到当天结束
+DAILY_MENU_STABLE = os.environ.get('DAILY_MENU_STABLE', '') == '1'
+DAILY_MENUS = {}
+# 线程池（asgi.py）和 gthread worker 里会并发调用 daily_menu，清理和写入要加锁
+DAILY_MENUS_LOCK = threading.Lock()
+
+def daily_menu(diet_type, snapshot, now):
+    """返回 (响应字节, ETag)"""
+    key = (diet_type, now.date().isoformat(), snapshot.version)
+    entry = DAILY_MENUS.get(key)
+    METRICS.cache('daily_menu', entry is not None)
+    if entry is None:
+        body = build_today_payload(diet_type, snapshot, now, random.Random(repr(key)))
+        entry = (body, hashlib.sha1(body).hexdigest())
+        # 只保留当天当前版本的菜单，diet_type 来自用户输入，再加一个条数上限；
+        # 生成菜单在锁外，同时未命中的请求各生成一份，结果相同
+        with DAILY_MENUS_LOCK:
+            for old in [k for k in DAILY_MENUS if k[1:] != key[1:]]:
+                del DAILY_MENUS[old]
+            if len(DAILY_MENUS) < 32:
+                DAILY_MENUS[key] = entry
+    return entry
+
+def seconds_until_midnight(now):
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=now.tzinfo)
+    return max(int((tomorrow - now).total_seconds()), 1)
 
 # --- 5. API 路由 ---
+# 下面的 *_payload 函数只处理参数和数据，不依赖 Flask 的 request/Response，
+# asgi.py 的异步入口直接复用，两边的响应内容完全一致。
+# 返回 (响应体, 状态码)：响应体是 dict 时由入口编码成 JSON，bytes 为已编码好的 JSON
+
+def today_payload(diet_type):
+    """返回 (响应字节, ETag, 可缓存秒数)；没有开启稳定每日菜单时后两项为 None"""
+    snapshot = STORE.current()
+    now = CALENDAR.now()
+    if not DAILY_MENU_STABLE:
+        return build_today_payload(diet_type, snapshot, now), None, None
+    body, etag = daily_menu(diet_type, snapshot, now)
+    return body, etag, seconds_until_midnight(now)
+
 @app.route('/api/today', methods=['GET'])
 def get_today_recommendations():
-    diet_type = request.args.get('diet_type', '中餐')
-    return jsonify({
-        "date": datetime.now().strftime("%Y年%m月%d日"),
-        "lunar": get_lunar_info(),
-        "season": get_season(),
-        "recommendations": {
-            "breakfast": recommend_recipes(diet_type, "早餐"),
-            "lunch": recommend_recipes(diet_type, "午餐"),
-            "dinner": recommend_recipes(diet_type, "晚餐")
+    body, etag, max_age = today_payload(request.args.get('diet_type', '中餐'))
+    response = Response(body, mimetype='application/json')
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+def plan_payload(args):
+    """多天菜单：start=YYYY-MM-DD（默认今天），days=1~31（默认7）"""
+    diet_type = args.get('diet_type', '中餐')
+    today = CALENDAR.today()
+    try:
+        start = date.fromisoformat(args['start']) if args.get('start') else today
+        days = int(args.get('days', 7))
+    except ValueError:
+        return {"error": "日期或天数格式不正确"}, 400
+    if not 1 <= days <= PLAN_MAX_DAYS:
+        return {"error": f"天数需在1到{PLAN_MAX_DAYS}之间"}, 400
+    # 只允许最近的日期，避免任意日期把农历缓存撑大
+    if not today - timedelta(days=PLAN_MAX_DAYS) <= start <= today + timedelta(days=366):
+        return {"error": "只能安排一年以内的菜单"}, 400
+
+    snapshot = STORE.current()
+    rng = random.Random(repr((diet_type, start.isoformat(), days, snapshot.version))) if DAILY_MENU_STABLE else random
+    return build_plan_payload(diet_type, snapshot, start, days, rng), 200
+
+def respond(payload, status=200):
+    if isinstance(payload, bytes):
+        return Response(payload, status=status, mimetype='application/json')
+    with METRICS.timer('encode'):
+        return jsonify(payload), status
+
+@app.route('/api/plan', methods=['GET'])
+def get_meal_plan():
+    return respond(*plan_payload(request.args))
+
+# 完整匹配结果按 (数据版本, 关键词) 缓存，翻页直接切片
+SEARCH_RESULTS = SearchResultCache(int(os.environ.get('SEARCH_CACHE_SIZE', 256)))
+
+def encode_cursor(version, keyword, after, page, sort='default'):
+    """after：按原顺序时是上一页最后一道菜的下标，按相关度时是下一页的起始位置"""
+    raw = json.dumps([version, keyword, after, page, sort], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        version, keyword, after, page, *rest = json.loads(raw.decode('utf-8'))
+        return {"version": version, "keyword": keyword, "after": int(after), "page": int(page),
+                "sort": rest[0] if rest else 'default'}
+    except Exception:
+        return None
+
+# 相关度排序只排出需要的前 k 个（堆），翻到更深的页时再加倍重排
+RANK_DEPTH = 60
+
+def ranked_page(snapshot, keyword, page_size, offset=0):
+    """返回 (本页下标, 匹配总数, 匹配方式)"""
+    key = (snapshot.version, keyword, 'relevance')
+    need = offset + page_size + 1
+    entry = SEARCH_RESULTS.get(key)
+    METRICS.cache('search_results', entry is not None and (len(entry[0]) >= need or len(entry[0]) == entry[1]))
+    if entry is None or len(entry[0]) < min(need, entry[1]):
+        depth = max(need, RANK_DEPTH, 2 * len(entry[0]) if entry else 0)
+        entry = SEARCH_RESULTS.put_ranked(key, *snapshot.ranker.rank(keyword, depth))
+    ids, total, match_type = entry
+    return list(ids[offset:offset + page_size]), total, match_type
+
+def search_page(snapshot, keyword, page_size, skip=0, after=-1, with_total=True):
+    """返回 (本页下标, 总数或 None, 是否还有更多)
+
+    有缓存的完整结果时直接切片；需要总数时算出完整结果并缓存；
+    否则从 after 之后边匹配边数，拿到 page_size + 1 个就停止。"""
+    key = (snapshot.version, keyword)
+    all_ids = SEARCH_RESULTS.get(key)
+    METRICS.cache('search_results', all_ids is not None)
+    if all_ids is None and with_total:
+        all_ids = SEARCH_RESULTS.put(key, snapshot.search_index.search_ids(keyword))
+
+    if all_ids is not None:
+        start = bisect_right(all_ids, after) + skip
+        ids = list(all_ids[start:start + page_size])
+        return ids, len(all_ids), start + page_size < len(all_ids)
+
+    hits = list(islice(snapshot.search_index.iter_ids(keyword, after), skip, skip + page_size + 1))
+    return hits[:page_size], None, len(hits) > page_size
+
+def search_payload(data, start_ai=None):
+    """搜索菜谱；本页结果不够时调用 start_ai(keyword, search_type) 得到 (api_response, ai_job)"""
+    keyword = data.get('keyword', '').strip()
+
+    if not keyword:
+        return {"error": "请输入搜索关键词"}, 400
+
+    # 判断搜索类型（蔬菜或菜名）
+    vegetables = ['白菜', '萝卜', '土豆', '西红柿', '番茄', '黄瓜', '茄子', '豆角', '青椒', '辣椒',
+                 '芹菜', '菠菜', '韭菜', '香菜', '生菜', '油菜', '空心菜', '西兰花', '花菜',
+                 '胡萝卜', '洋葱', '大蒜', '生姜', '南瓜', '冬瓜', '丝瓜', '苦瓜', '豆芽',
+                 '莴笋', '芦笋', '蘑菇', '木耳', '香菇', '金针菇', '平菇', '豆腐', '竹笋']
+
+    search_type = '蔬菜' if any(veg in keyword for veg in vegetables) else '菜名'
+
+    # 获取分页参数
+    page = int(data.get('page', 1))  # 当前页码，默认第1页
+    page_size = int(data.get('page_size', 3))  # 每页显示数量，默认3个
+    with_total = data.get('with_total', True)  # 不需要总数时可以提前结束匹配
+    snapshot = STORE.current()
+
+    # 本地搜索 - 默认按相关度（菜名 > 标签 > 食材，找不到时试拼音和近似拼写）；
+    # sort=default 时保持文件顺序，不需要总数时可以提前结束匹配
+    sort = data.get('sort', 'relevance')
+    cursor = None
+    if data.get('cursor'):
+        cursor = decode_cursor(data['cursor'])
+        if (cursor is None or cursor['keyword'] != keyword or cursor['version'] != snapshot.version
+                or cursor['sort'] != sort):
+            return {"error": "分页已失效，请重新搜索"}, 400
+        page = cursor['page']
+
+    next_cursor = None
+    if sort == 'relevance':
+        offset = cursor['after'] if cursor else (page - 1) * page_size
+        with METRICS.timer('search_match'):
+            ids, total_count, match_type = ranked_page(snapshot, keyword, page_size, offset)
+        has_more = offset + len(ids) < total_count
+        if has_more:
+            next_cursor = encode_cursor(snapshot.version, keyword, offset + len(ids), page + 1, sort)
+    else:
+        after, skip = (cursor['after'], 0) if cursor else (-1, (page - 1) * page_size)
+        with METRICS.timer('search_match'):
+            ids, total_count, has_more = search_page(snapshot, keyword, page_size, skip=skip, after=after,
+                                                     with_total=with_total)
+        match_type = 'exact' if ids or total_count else None
+        if has_more and ids:
+            next_cursor = encode_cursor(snapshot.version, keyword, ids[-1], page + 1, sort)
+    results = [snapshot.recipes[i] for i in ids]
+
+    total_pages = None
+    if total_count is not None:
+        total_pages = (total_count + page_size - 1) // page_size  # 向上取整
+
+    # 只在第一页且结果不够时调用API：缓存命中直接返回，否则转入后台任务
+    api_response = None
+    ai_job = None
+    if page == 1 and len(ids) < page_size and not has_more:
+        api_response, ai_job = (start_ai or start_ai_job)(keyword, search_type)
+
+    found_local = total_count > 0 if total_count is not None else bool(ids) or page > 1
+    return {
+        "keyword": keyword,
+        "type": search_type,
+        "source": "本地数据库" if found_local else "AI推荐",
+        "match_type": match_type,  # exact / pinyin / fuzzy
+        "results": results,
+        "api_response": api_response,
+        "ai_job": ai_job,
+        "pagination": {
+            "current_page": page,
+            "page_size": page_size,
+            "total_count": total_count,
+            "total_pages": total_pages,
+            "has_more": has_more,
+            "next_cursor": next_cursor
         }
-    })
+    }, 200
 
 @app.route('/api/search', methods=['POST'])
 def search_recipes():
     """搜索菜谱"""
     try:
-        data = request.get_json()
-        keyword = data.get('keyword', '').strip()
-
-        if not keyword:
-            return jsonify({"error": "请输入搜索关键词"}), 400
-
-        # 判断搜索类型（蔬菜或菜名）
-        vegetables = ['白菜', '萝卜', '土豆', '西红柿', '番茄', '黄瓜', '茄子', '豆角', '青椒', '辣椒',
-                     '芹菜', '菠菜', '韭菜', '香菜', '生菜', '油菜', '空心菜', '西兰花', '花菜',
-                     '胡萝卜', '洋葱', '大蒜', '生姜', '南瓜', '冬瓜', '丝瓜', '苦瓜', '豆芽',
-                     '莴笋', '芦笋', '蘑菇', '木耳', '香菇', '金针菇', '平菇', '豆腐', '竹笋']
-
-        search_type = '蔬菜' if any(veg in keyword for veg in vegetables) else '菜名'
-
-        # 获取分页参数
-        page = int(data.get('page', 1))  # 当前页码，默认第1页
-        page_size = int(data.get('page_size', 3))  # 每页显示数量，默认3个
-
-        # 本地搜索 - 搜索所有匹配结果
-        all_results = []
-        for recipe in RECIPES:
-            # 在菜名、食材中搜索
-            if (keyword in recipe.get('name', '') or
-                any(keyword in ing for ing in recipe.get('ingredients', []))):
-                all_results.append(recipe)
-
-        # 计算分页
-        total_count = len(all_results)
-        total_pages = (total_count + page_size - 1) // page_size  # 向上取整
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        results = all_results[start_idx:end_idx]
-
-        # 只在第一页且结果不够时调用API
-        api_response = None
-        if page == 1 and total_count < page_size:
-            api_response = call_siliconflow_api(keyword, search_type)
-
-        return jsonify({
-            "keyword": keyword,
-            "type": search_type,
-            "source": "本地数据库" if all_results else "AI推荐",
-            "results": results,
-            "api_response": api_response,
-            "pagination": {
-                "current_page": page,
-                "page_size": page_size,
-                "total_count": total_count,
-                "total_pages": total_pages,
-                "has_more": page < total_pages
-            }
-        })
-
+        return respond(*search_payload(request.get_json()))
     except Exception as e:
         print(f"搜索出错: {e}")
         return jsonify({"error": "搜索失败，请稍后重试"}), 500
 
-def call_siliconflow_api(keyword, search_type):
-    """调用硅基流动API获取菜谱推荐"""
-    api_key = os.environ.get('SILICONFLOW_API_KEY', '')
-
-    if not api_key:
-        return None
+def pantry_payload(data):
+    """用手头的食材做菜：按食材覆盖率、缺少的食材数排序"""
+    items = data.get('ingredients', [])
+    if isinstance(items, str):
+        items = [x for x in items.replace('，', ',').replace('、', ',').split(',')]
+    if not isinstance(items, list) or not any(str(x).strip() for x in items):
+        return {"error": "请输入手头的食材"}, 400
 
     try:
-        url = "https://api.siliconflow.cn/v1/chat/completions"
-
-        # 构建提示词
-        if search_type == '蔬菜':
-            prompt = f"请推荐3-4道以{keyword}为主料的家常菜，每道菜包含：菜名、食材清单、制作步骤。要求简洁实用，适合家庭制作。"
-        else:
-            prompt = f"请提供{keyword}的详细做法，包含：食材清单、制作步骤。要求步骤清晰，适合家庭制作。"
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
+        limit = max(1, min(int(data.get('limit', 10)), 50))
+    except (TypeError, ValueError):
+        return {"error": "数量格式不正确"}, 400
+    assume_staples = bool(data.get('assume_staples', True))  # 盐、油、酱油等默认视为已有
+    snapshot = STORE.current()
+    index = snapshot.ingredient_index
+
+    pantry, unknown = index.normalize(items)
+    with METRICS.timer('pantry_match'):
+        ranked = index.top_k(pantry, limit, assume_staples)
+
+    results = [{
+        "recipe": snapshot.recipes[idx],
+        "coverage": round(popcount(hit) / popcount(hit | miss), 3),
+        "matched": index.names_of(hit),
+        "missing": index.names_of(miss),
+    } for idx, hit, miss in ranked]
+    return {"pantry": pantry, "unknown": unknown, "results": results}, 200
+
+@app.route('/api/pantry', methods=['POST'])
+def pantry_recipes():
+    try:
+        return respond(*pantry_payload(request.get_json() or {}))
+    except Exception as e:
+        print(f"食材匹配出错: {e}")
+        return jsonify({"error": "匹配失败，请稍后重试"}), 500
+
+# AI 回复缓存：提示词或模型变化时修改版本号，旧缓存自然失效
+AI_MODEL = "deepseek-ai/DeepSeek-V3"
+PROMPT_VERSION = 1
+AI_CACHE = create_ai_cache()
+SILICONFLOW = create_client()
+
+def build_prompt(keyword, search_type):
+    """构建提示词"""
+    if search_type == '蔬菜':
+        return f"请推荐3-4道以{keyword}为主料的家常菜，每道菜包含：菜名、食材清单、制作步骤。要求简洁实用，适合家庭制作。"
+    return f"请提供{keyword}的详细做法，包含：食材清单、制作步骤。要求步骤清晰，适合家庭制作。"
+
+def ai_payload(keyword, search_type):
+    return {
+        "model": AI_MODEL,
+        "messages": [
+            {"role": "system", "content": "你是一个专业的中餐厨师，擅长制作家常菜。"},
+            {"role": "user", "content": build_prompt(keyword, search_type)}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 1000
+    }
+
+def call_siliconflow_api(keyword, search_type, on_token=None):
+    """调用硅基流动API获取菜谱推荐（先查持久化缓存，相同的并发请求只发一次）"""
+    if not SILICONFLOW.api_key:
+        return None
 
-        payload = {
-            "model": "deepseek-ai/DeepSeek-V3",
-            "messages": [
-                {"role": "system", "content": "你是一个专业的中餐厨师，擅长制作家常菜。"},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 1000
-        }
+    payload = ai_payload(keyword, search_type)
 
-        response = requests.post(url, json=payload, headers=headers, timeout=30)
+    def fetch():
+        # 只统计真正发往上游的请求，缓存命中和合并掉的并发请求不算
+        METRICS.inc("recipe_upstream_requests_total")
+        with METRICS.timer('upstream'):
+            return SILICONFLOW.chat(payload, on_token)
 
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        else:
-            print(f"API调用失败: {response.status_code}")
-            return None
+    try:
+        key = AI_CACHE.make_key(keyword, search_type, AI_MODEL, PROMPT_VERSION)
+        return AI_CACHE.get_or_compute(key, fetch)
 
+    except CircuitOpenError:
+        # 上游持续故障，熔断期间直接放弃，不再等待超时
+        METRICS.inc("recipe_upstream_errors_total", kind="circuit_open")
+        return None
     except requests.exceptions.Timeout:
-        print(f"API调用超时: 请求超过30秒")
+        METRICS.inc("recipe_upstream_errors_total", kind="timeout")
+        print(f"API调用超时: 请求超过{SILICONFLOW.timeout[1]:g}秒")
         return "AI服务响应超时，请稍后再试。您可以尝试搜索其他菜谱。"
     except requests.exceptions.RequestException as e:
+        METRICS.inc("recipe_upstream_errors_total", kind="network")
         print(f"API网络错误: {e}")
         return None
     except Exception as e:
+        METRICS.inc("recipe_upstream_errors_total", kind="error")
         print(f"API调用出错: {e}")
         return None
 
+# --- 6. AI 后台任务 ---
+AI_JOBS = AIJobManager(max_workers=int(os.environ.get('AI_JOB_WORKERS', 4)),
+                       max_pending=int(os.environ.get('AI_JOB_MAX_PENDING', 32)))
+
+def ai_cache_key(keyword, search_type):
+    return AI_CACHE.make_key(keyword, search_type, AI_MODEL, PROMPT_VERSION)
+
+def submit_ai_job(key, keyword, search_type):
+    """在后台线程池里调用上游；返回任务，队列已满时返回 None"""
+    return AI_JOBS.submit(key, lambda j: call_siliconflow_api(keyword, search_type, on_token=j.append))
+
+def start_ai_job(keyword, search_type, submit=submit_ai_job):
+    """返回 (api_response, ai_job)：缓存命中时直接给出结果，否则用 submit 提交后台任务。
+    任务 id 就是缓存 key，请求落到其他 worker 时也能从共享缓存里取到结果。"""
+    if not SILICONFLOW.api_key:
+        return None, None
+
+    key = ai_cache_key(keyword, search_type)
+    cached = AI_CACHE.get(key)
+    METRICS.cache('ai_response', cached is not None)
+    if cached is not None:
+        return cached, None
+
+    job = submit(key, keyword, search_type)
+    if job is None:
+        return None, None
+    return None, {
+        "id": job.id,
+        "status": job.status,
+        "poll_url": f"/api/search/ai/{job.id}",
+        "stream_url": f"/api/search/ai/{job.id}/stream"
+    }
+
+def ai_job_snapshot(job_id, jobs=AI_JOBS):
+    """本进程的任务直接读状态，否则到共享缓存里查；都没有返回 None"""
+    job = jobs.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    cached = AI_CACHE.get(job_id)
+    if cached is not None:
+        return {"job_id": job_id, "status": "done", "content": cached, "done": True}
+    if AI_CACHE.is_inflight(job_id):
+        return {"job_id": job_id, "status": "running", "content": "", "done": False}
+    return None
+
+@app.route('/api/search/ai/<job_id>', methods=['GET'])
+def poll_ai_job(job_id):
+    """轮询AI任务：返回目前已生成的内容"""
+    snapshot = ai_job_snapshot(job_id)
+    if snapshot is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+    return jsonify(snapshot)
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+@app.route('/api/search/ai/<job_id>/stream', methods=['GET'])
+def stream_ai_job(job_id):
+    """以 Server-Sent Events 推送AI生成的内容（token 事件为增量，done 事件为完整结果）"""
+    if ai_job_snapshot(job_id) is None:
+        return jsonify({"error": "任务不存在或已过期"}), 404
+
+    def generate():
+        job = AI_JOBS.get(job_id)
+        if job is not None:
+            sent = 0
+            version = -1
+            while True:
+                previous, version = version, job.wait(version, timeout=15)
+                text = job.text()
+                if len(text) > sent:
+                    yield sse('token', {"delta": text[sent:]})
+                    sent = len(text)
+                elif version == previous:
+                    yield ": keep-alive\n\n"
+                if job.finished:
+                    yield sse('done', job.snapshot())
+                    return
+
+        # 任务在其他 worker 上：等待共享缓存里出现结果
+        while True:
+            snapshot = ai_job_snapshot(job_id)
+            if snapshot is None:
+                yield sse('done', {"job_id": job_id, "status": "failed", "content": "", "done": True})
+                return
+            if snapshot['done']:
+                yield sse('done', snapshot)
+                return
+            time.sleep(0.5)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+def health_payload():
+    snapshot = STORE.current()
+    return {"status": "ok", "db_size": len(snapshot.recipes), "recipes": snapshot.info(),
+            "siliconflow": SILICONFLOW.status()}
+
 @app.route('/api/health')
 def health():
-    return jsonify({"status": "ok", "db_size": len(RECIPES)})
+    return jsonify(health_payload())
+
+def metrics_text():
+    """Prometheus 文本格式；计数器和直方图为所有 worker 之和，gauge 为处理本次请求的 worker"""
+    snapshot = STORE.current()
+    breaker = SILICONFLOW.status()
+    gauges = {
+        "recipe_db_size": ("当前加载的菜谱数", len(snapshot.recipes)),
+        "recipe_upstream_circuit_open": ("硅基流动API熔断器是否打开", int(breaker['circuit']['state'] == 'open')),
+    }
+    return METRICS.render(gauges)
+
+METRICS_MIMETYPE = 'text/plain; version=0.0.4'
+
+@app.route('/api/metrics')
+def metrics():
+    return Response(metrics_text(), mimetype=METRICS_MIMETYPE)
+
+# 前端文件启动时读入内存：加内容指纹、改写 index.html 的引用、预先压缩（见 static_assets.py）
+ASSETS = StaticAssets(frontend_dir)
 
 @app.route('/')
 def index():
-    # 优先返回 frontend 目录下的 index.html
-    return send_from_directory(app.template_folder, 'index.html')
+    # 返回 frontend 目录下的 index.html（引用已换成带指纹的地址）；只部署后端时没有首页
+    if ASSETS.index is None:
+        abort(404)
+    return ASSETS.index.response(request)
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    asset = ASSETS.get(filename)
+    if asset is None:
+        # 启动后新增的文件：照常从磁盘读
+        return send_from_directory(ASSETS.static_dir, filename)
+    return asset.response(request)
 
 if __name__ == '__main__':
     # 兼容云端端口
     port = int(os.environ.get('PORT', 5000))
+    start_watching()
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
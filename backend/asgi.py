@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI 入口，与 app:app 并存
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT
+
+路由和响应内容与 Flask 版相同：参数处理、推荐、搜索都调用 app.py 里的 *_payload 函数，
+并用同一个 JSON provider 编码。不同的只是等待的方式：
+- 推荐、搜索、食材匹配和 JSON 编码是 CPU 工作，放到线程池里执行，不阻塞事件循环
+- AI 补充用 httpx 异步客户端，任务是事件循环里的协程；轮询和 SSE 等待上游时不占线程。
+  gunicorn 的 gthread worker 每条 SSE 连接占一个线程，这里一个进程就能同时挂住大量等待 AI 的连接
+对比压测见 compare_servers.py。
+"""
+import asyncio
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+from anyio import from_thread
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.routing import Route
+from werkzeug.http import parse_etags, quote_etag
+from werkzeug.security import safe_join
+
+import app as core
+from ai_jobs import AsyncAIJobManager
+from siliconflow_client import AsyncSiliconFlowClient, CircuitOpenError, create_client
+
+# 与同步客户端共用熔断器，/api/health 里看到的状态一致
+SILICONFLOW = create_client(AsyncSiliconFlowClient, breaker=core.SILICONFLOW.breaker)
+# 等待上游不占线程，同时进行的 AI 任务可以比线程池版本多得多
+AI_JOBS = AsyncAIJobManager(max_workers=int(os.environ.get('ASGI_AI_CONCURRENCY', 64)),
+                            max_pending=int(os.environ.get('ASGI_AI_MAX_PENDING', 256)))
+
+
+def encode(payload):
+    """与 Flask 的 jsonify 相同：同一个 JSON provider、紧凑分隔符、结尾换行"""
+    return (core.app.json.dumps(payload, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def json_response(body, status=200, headers=None):
+    return Response(body, status_code=status, headers=headers, media_type='application/json')
+
+
+def encoded(payload, status):
+    """在线程池里调用：dict 编码成 JSON，bytes 原样返回"""
+    if isinstance(payload, bytes):
+        return payload, status
+    with core.METRICS.timer('encode'):
+        return encode(payload), status
+
+
+# --- AI 补充 ---
+async def call_siliconflow_api(keyword, search_type, on_token=None):
+    """core.call_siliconflow_api 的协程版本，错误处理和计数相同"""
+    if not SILICONFLOW.api_key:
+        return None
+
+    payload = core.ai_payload(keyword, search_type)
+
+    async def fetch():
+        core.METRICS.inc("recipe_upstream_requests_total")
+        with core.METRICS.timer('upstream'):
+            return await SILICONFLOW.chat(payload, on_token)
+
+    try:
+        return await core.AI_CACHE.get_or_compute_async(core.ai_cache_key(keyword, search_type), fetch)
+
+    except CircuitOpenError:
+        core.METRICS.inc("recipe_upstream_errors_total", kind="circuit_open")
+        return None
+    except httpx.TimeoutException:
+        core.METRICS.inc("recipe_upstream_errors_total", kind="timeout")
+        print(f"API调用超时: 请求超过{SILICONFLOW.timeout[1]:g}秒")
+        return "AI服务响应超时，请稍后再试。您可以尝试搜索其他菜谱。"
+    except httpx.HTTPError as e:
+        core.METRICS.inc("recipe_upstream_errors_total", kind="network")
+        print(f"API网络错误: {e}")
+        return None
+    except Exception as e:
+        core.METRICS.inc("recipe_upstream_errors_total", kind="error")
+        print(f"API调用出错: {e}")
+        return None
+
+
+def submit_ai_job(key, keyword, search_type):
+    """search_payload 在线程池里调用：回到事件循环提交协程任务"""
+    return from_thread.run_sync(AI_JOBS.submit, key,
+                                lambda job: call_siliconflow_api(keyword, search_type, on_token=job.append))
+
+
+def start_ai_job(keyword, search_type):
+    return core.start_ai_job(keyword, search_type, submit=submit_ai_job)
+
+
+# --- 路由 ---
+async def index(request):
+    if core.ASSETS.index is None:
+        return Response(status_code=404)
+    return asset_response(core.ASSETS.index, request)
+
+
+async def static_file(request):
+    filename = request.path_params['filename']
+    asset = core.ASSETS.get(filename)
+    if asset is None:
+        # 启动后新增的文件：照常从磁盘读
+        path = safe_join(core.ASSETS.static_dir, filename)
+        if path is None or not os.path.isfile(path):
+            return Response(status_code=404)
+        return FileResponse(path)
+    return asset_response(asset, request)
+
+
+def asset_response(asset, request):
+    status, body, headers = asset.select(request.headers.get('accept-encoding'),
+                                         request.headers.get('if-none-match'))
+    return Response(body, status_code=status, headers=headers, media_type=None if status == 304 else asset.mimetype)
+
+
+async def today(request):
+    body, etag, max_age = await run_in_threadpool(core.today_payload, request.query_params.get('diet_type', '中餐'))
+    if etag is None:
+        return json_response(body)
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': f'public, max-age={max_age}'}
+    if parse_etags(request.headers.get('if-none-match')).contains(etag):
+        return Response(status_code=304, headers=headers)
+    return json_response(body, headers=headers)
+
+
+async def plan(request):
+    return json_response(*await run_in_threadpool(lambda: encoded(*core.plan_payload(request.query_params))))
+
+
+async def search(request):
+    try:
+        data = await request.json()
+        return json_response(*await run_in_threadpool(lambda: encoded(*core.search_payload(data, start_ai_job))))
+    except Exception as e:
+        print(f"搜索出错: {e}")
+        return json_response(encode({"error": "搜索失败，请稍后重试"}), 500)
+
+
+async def pantry(request):
+    try:
+        data = await request.json() or {}
+        return json_response(*await run_in_threadpool(lambda: encoded(*core.pantry_payload(data))))
+    except Exception as e:
+        print(f"食材匹配出错: {e}")
+        return json_response(encode({"error": "匹配失败，请稍后重试"}), 500)
+
+
+async def poll_ai_job(request):
+    snapshot = await run_in_threadpool(core.ai_job_snapshot, request.path_params['job_id'], AI_JOBS)
+    if snapshot is None:
+        return json_response(encode({"error": "任务不存在或已过期"}), 404)
+    return json_response(encode(snapshot))
+
+
+async def stream_ai_job(request):
+    """与 Flask 版相同的 SSE 事件，等待内容时 await，不占线程"""
+    job_id = request.path_params['job_id']
+    if await run_in_threadpool(core.ai_job_snapshot, job_id, AI_JOBS) is None:
+        return json_response(encode({"error": "任务不存在或已过期"}), 404)
+
+    async def generate():
+        job = AI_JOBS.get(job_id)
+        if job is not None:
+            sent = 0
+            version = -1
+            while True:
+                previous, version = version, await job.wait_async(version, timeout=15)
+                text = job.text()
+                if len(text) > sent:
+                    yield core.sse('token', {"delta": text[sent:]})
+                    sent = len(text)
+                elif version == previous:
+                    yield ": keep-alive\n\n"
+                if job.finished:
+                    yield core.sse('done', job.snapshot())
+                    return
+
+        # 任务在其他 worker 上：等待共享缓存里出现结果
+        while True:
+            snapshot = await run_in_threadpool(core.ai_job_snapshot, job_id, AI_JOBS)
+            if snapshot is None:
+                yield core.sse('done', {"job_id": job_id, "status": "failed", "content": "", "done": True})
+                return
+            if snapshot['done']:
+                yield core.sse('done', snapshot)
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=core.SSE_HEADERS)
+
+
+async def health(request):
+    return json_response(encode(core.health_payload()))
+
+
+async def metrics(request):
+    # 多 worker 时要读目录里的汇总文件
+    return Response(await run_in_threadpool(core.metrics_text), media_type=core.METRICS_MIMETYPE)
+
+
+def route(path, endpoint, methods=('GET',)):
+    """给每个请求计时；路由标签写成 Flask 的形式，两种入口的监控数据可以直接对比"""
+    label = re.sub(r'\{(\w+):(\w+)\}', r'<\2:\1>', path)
+    label = re.sub(r'\{(\w+)\}', r'<\1>', label)
+
+    async def timed(request):
+        started = time.perf_counter()
+        response = await endpoint(request)
+        core.METRICS.observe("recipe_http_request_duration_seconds", time.perf_counter() - started,
+                             route=label, method=request.method, status=response.status_code)
+        return response
+
+    return Route(path, timed, methods=list(methods))
+
+
+@asynccontextmanager
+async def lifespan(_):
+    # 每个 worker 进程的事件循环启动时（主线程）开启菜谱热加载
+    core.start_watching()
+    yield
+    await SILICONFLOW.aclose()
+
+
+app = Starlette(
+    routes=[
+        route('/', index),
+        route('/static/{filename:path}', static_file),
+        route('/api/today', today),
+        route('/api/plan', plan),
+        route('/api/search', search, methods=('POST',)),
+        route('/api/pantry', pantry, methods=('POST',)),
+        route('/api/search/ai/{job_id}', poll_ai_job),
+        route('/api/search/ai/{job_id}/stream', stream_ai_job),
+        route('/api/health', health),
+        route('/api/metrics', metrics),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+接口压测
+
+用法:
+    python generate_recipes.py --count 100k -o /tmp/recipes_100k.json
+    python benchmark.py --recipes /tmp/recipes_100k.json               进程内（Flask test client）
+    python benchmark.py --url http://127.0.0.1:5000 -c 16              通过 HTTP 压测已启动的服务
+    python benchmark.py ... --save-baseline bench_baseline.json        保存本次结果作为基线
+    python benchmark.py ... --baseline bench_baseline.json             与基线对比，退化超过容忍度时退出码为 1
+
+每个接口报告 p50 / p95 / p99 延迟（毫秒）和每秒请求数。
+进程内模式会清空 SILICONFLOW_API_KEY，只测本地逻辑，不会调用 AI。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def search_keywords():
+    """搜索词：常见食材、菜名片段，外加一些搜不到的词"""
+    from generate_recipes import all_recipes
+    words = [ing.split(' ')[0] for r in all_recipes for ing in r['ingredients']]
+    words += [r['name'][:2] for r in all_recipes] + [r['name'] for r in all_recipes[:30]]
+    return words + ['不存在的菜', '火星菜']
+
+
+def fuzzy_keywords():
+    """拼音和错字：菜名的全拼、首字母，以及把菜名中间一个字换掉"""
+    from fuzzy_index import pinyin_keys
+    from generate_recipes import all_recipes
+    names = [r['name'] for r in all_recipes if len(r['name']) >= 4]
+    words = [name[:1] + '某' + name[2:] for name in names]
+    for name in names:
+        keys = pinyin_keys(name)
+        if keys:
+            words += keys
+    return words
+
+
+def scenarios():
+    """(名称, 方法, 路径, 生成请求体的函数)"""
+    keywords = search_keywords()
+    fuzzy = fuzzy_keywords()
+    return [
+        ("today 中餐", "GET", "/api/today?diet_type=%E4%B8%AD%E9%A4%90", None),
+        ("today 地中海", "GET", "/api/today?diet_type=%E5%9C%B0%E4%B8%AD%E6%B5%B7", None),
+        ("plan 30天", "GET", "/api/plan?days=30&diet_type=%E4%B8%AD%E9%A4%90", None),
+        ("search 第1页", "POST", "/api/search",
+         lambda rng: {"keyword": rng.choice(keywords), "page": 1, "page_size": 3}),
+        ("search 第5页", "POST", "/api/search",
+         lambda rng: {"keyword": rng.choice(keywords), "page": 5, "page_size": 3}),
+        ("search 拼音/错字", "POST", "/api/search",
+         lambda rng: {"keyword": rng.choice(fuzzy), "page": 1, "page_size": 3}),
+        ("pantry", "POST", "/api/pantry",
+         lambda rng: {"ingredients": rng.sample(keywords[:200], 4), "limit": 10}),
+        ("health", "GET", "/api/health", None),
+    ]
+
+
+class InProcessClient:
+    def __init__(self, recipes):
+        if recipes:
+            os.environ['RECIPES_PATH'] = os.path.abspath(recipes)
+        os.environ['SILICONFLOW_API_KEY'] = ''
+        os.environ.setdefault('RECIPES_RELOAD_INTERVAL', '0')
+        os.environ.setdefault('AI_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'bench_ai_cache.sqlite3'))
+        sys.path.insert(0, BASE_DIR)
+        import app as app_module
+        self.app = app_module.app
+        self.db_size = len(app_module.STORE.current().recipes)
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+
+class HTTPClient:
+    def __init__(self, url):
+        import requests
+        self.url = url.rstrip('/')
+        self._requests = requests
+        self._local = threading.local()
+        self.db_size = requests.get(f"{self.url}/api/health", timeout=10).json().get('db_size')
+
+    def request(self, method, path, body):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.request(method, f"{self.url}{path}", json=body, timeout=60)
+        return response.status_code
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def run_scenario(client, method, path, make_body, requests_count, concurrency, seed):
+    rng_lock = threading.Lock()
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+
+    def one(_):
+        nonlocal errors
+        with rng_lock:
+            body = make_body(rng) if make_body else None
+        started = time.perf_counter()
+        try:
+            status = client.request(method, path, body)
+        except Exception:
+            status = 0
+        elapsed = (time.perf_counter() - started) * 1000
+        with rng_lock:
+            latencies.append(elapsed)
+            if status >= 400 or status == 0:
+                errors += 1
+
+    # 预热
+    for i in range(min(20, requests_count)):
+        one(i)
+    latencies.clear()
+    errors = 0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests_count,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "rps": round(requests_count / wall, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """返回退化项列表：p95 变慢或吞吐下降超过 tolerance"""
+    regressions = []
+    for name, base in baseline.get('endpoints', {}).items():
+        cur = results['endpoints'].get(name)
+        if cur is None:
+            continue
+        if cur['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if cur['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['rps']} -> {cur['rps']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="菜谱接口压测")
+    parser.add_argument('--url', help="压测已启动的服务，如 http://127.0.0.1:5000；不填则进程内压测")
+    parser.add_argument('--recipes', help="进程内模式使用的菜谱文件")
+    parser.add_argument('-n', '--requests', type=int, default=500, help="每个接口的请求数")
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help="并发数")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--only', help="只跑名称包含该字符串的接口")
+    parser.add_argument('--save-baseline', help="把结果保存为基线 JSON")
+    parser.add_argument('--baseline', help="与基线 JSON 对比")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的退化比例，默认 0.25")
+    parser.add_argument('--json', action='store_true', help="输出 JSON 而不是表格")
+    args = parser.parse_args()
+
+    client = HTTPClient(args.url) if args.url else InProcessClient(args.recipes)
+    results = {
+        "meta": {
+            "mode": "http" if args.url else "in-process",
+            "db_size": client.db_size,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "python": sys.version.split()[0],
+        },
+        "endpoints": {}
+    }
+
+    for name, method, path, make_body in scenarios():
+        if args.only and args.only not in name:
+            continue
+        results['endpoints'][name] = run_scenario(client, method, path, make_body,
+                                                  args.requests, args.concurrency, args.seed)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        meta = results['meta']
+        print(f"模式: {meta['mode']}  菜谱数: {meta['db_size']}  并发: {meta['concurrency']}")
+        print(f"{'接口':<14}{'请求':>7}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'rps':>10}")
+        for name, r in results['endpoints'].items():
+            print(f"{name:<14}{r['requests']:>7}{r['errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+                  f"{r['p99_ms']:>10}{r['rps']:>10}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('db_size') != results['meta']['db_size']:
+            print(f"注意: 基线菜谱数 {baseline.get('meta', {}).get('db_size')} 与本次 "
+                  f"{results['meta']['db_size']} 不同，对比结果仅供参考")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("与基线相比没有明显退化")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+农历 / 节气 / 节日 按日期缓存
+
+农历信息一天只变一次，按用户所在时区的本地日期缓存，
+支持启动时预计算整年，或在第一次访问某月时整月计算。
+"""
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+from lunar_python import Lunar, Solar
+from lunar_python.util import LunarUtil
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+DEFAULT_TIMEZONE = 'Asia/Shanghai'
+
+FALLBACK_INFO = {"lunar_date": "加载中", "festival": [], "solar_term": ""}
+
+
+def load_timezone(name):
+    """按名称加载时区，加载失败时退回服务器本地时间"""
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(name)
+    except Exception as e:
+        print(f"时区 {name} 加载失败，使用服务器本地时间: {e}")
+        return None
+
+
+# 清明日期 -> {公历日期: [寒食节/春社/秋社]}
+_SHE_DAYS = {}
+
+
+def _seasonal_festivals(lunar):
+    """寒食、春社、秋社 每年只算一次。
+    lunar.getOtherFestivals() 每天都要把立春、立秋再转一次农历，
+    跨年时会反复重算整年节气（每天十几毫秒），结果与它完全一致。"""
+    jieqi = lunar.getJieQiTable()
+    key = jieqi["清明"].toYmd()
+    table = _SHE_DAYS.get(key)
+    if table is None:
+        table = {}
+        table.setdefault(jieqi["清明"].next(-1).toYmd(), []).append("寒食节")
+        for term, name in (("立春", "春社"), ("立秋", "秋社")):
+            jq = jieqi[term]
+            offset = (4 - jq.getLunar().getDayGanIndex()) % 10
+            table.setdefault(jq.next(offset + 40).toYmd(), []).append(name)
+        _SHE_DAYS[key] = table
+    return table
+
+
+def compute_lunar_info(day):
+    """调用 lunar_python 计算某一天的农历信息"""
+    solar = Solar.fromYmd(day.year, day.month, day.day)
+    lunar = Lunar.fromSolar(solar)
+
+    # 处理节日列表，防止返回 None 导致合并报错
+    festivals = lunar.getFestivals() or []
+    other_festivals = list(LunarUtil.OTHER_FESTIVAL.get(f"{lunar.getMonth()}-{lunar.getDay()}", []))
+    other_festivals += _seasonal_festivals(lunar).get(solar.toYmd(), [])
+
+    return {
+        "lunar_date": f"{lunar.getMonthInChinese()}月{lunar.getDayInChinese()}",
+        "festival": festivals + other_festivals,
+        "solar_term": lunar.getJieQi() or "",
+        "year": lunar.getYearInGanZhi(),
+        "month": lunar.getMonth(),
+        "day": lunar.getDay()
+    }
+
+
+def season_of(day):
+    month = day.month
+    if month in [3, 4, 5]: return "春季"
+    elif month in [6, 7, 8]: return "夏季"
+    elif month in [9, 10, 11]: return "秋季"
+    else: return "冬季"
+
+
+class CalendarCache:
+    """本地日期 -> 农历信息 的进程内缓存"""
+
+    def __init__(self, tz_name=DEFAULT_TIMEZONE):
+        self.tz_name = tz_name
+        self.tz = load_timezone(tz_name)
+        self._days = {}
+        self._warming = set()
+        self._lock = threading.Lock()
+
+    def now(self):
+        """用户时区的当前时间；跨过本地零点后 today() 自然变为新的一天"""
+        return datetime.now(self.tz) if self.tz else datetime.now()
+
+    def today(self):
+        return self.now().date()
+
+    def _compute(self, day):
+        try:
+            info = compute_lunar_info(day)
+        except Exception as e:
+            print(f"农历转换出错 ({day}): {e}")
+            return None
+        self._days[day] = info
+        return info
+
+    def precompute_range(self, start, days):
+        for i in range(days):
+            day = start + timedelta(days=i)
+            if day not in self._days:
+                self._compute(day)
+
+    def precompute_month(self, year, month):
+        first = date(year, month, 1)
+        next_month = date(year + month // 12, month % 12 + 1, 1)
+        self.precompute_range(first, (next_month - first).days)
+
+    def precompute_year(self, start=None):
+        """从 start（默认今天）起预计算一整年"""
+        self.precompute_range(start or self.today(), 366)
+
+    def _warm_month_async(self, day):
+        key = (day.year, day.month)
+        with self._lock:
+            if key in self._warming:
+                return
+            self._warming.add(key)
+        threading.Thread(target=self.precompute_month, args=key, daemon=True).start()
+
+    def lunar_range(self, start, days):
+        """连续多天的农历信息，缺的日期在当前线程一次性顺序补齐"""
+        self.precompute_range(start, days)
+        return [self._days.get(start + timedelta(days=i)) or dict(FALLBACK_INFO) for i in range(days)]
+
+    def is_cached(self, day=None):
+        return (day or self.today()) in self._days
+
+    def lunar_info(self, day=None):
+        """某天（默认今天）的农历信息；未命中时先算当天，再在后台补齐整月"""
+        day = day or self.today()
+        info = self._days.get(day)
+        if info is None:
+            info = self._compute(day)
+            self._warm_month_async(day)
+        return info if info is not None else dict(FALLBACK_INFO)
+
+    def season(self, day=None):
+        return season_of(day or self.today())
+
+
+def create_calendar():
+    """按环境变量创建日历缓存
+
+    APP_TIMEZONE      用户所在时区，默认 Asia/Shanghai
+    CALENDAR_PRELOAD  year = 启动后在后台预计算未来一整年，month = 按月懒加载（默认）
+    """
+    calendar = CalendarCache(os.environ.get('APP_TIMEZONE', DEFAULT_TIMEZONE))
+    if os.environ.get('CALENDAR_PRELOAD', 'month') == 'year':
+        threading.Thread(target=calendar.precompute_year, daemon=True).start()
+    return calendar
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的只读菜谱存储
+
+json.load 出来的嵌套 dict/list/str 每个 worker 各占一份，内存随 worker 数线性增长。
+这里把菜谱按列存进一块连续的二进制缓冲区：
+
+- 字符串表：所有字符串去重（类别、季节、餐次、常用食材自然只存一份），UTF-8 拼接 + 偏移数组
+- 标量列：每条菜谱一个字符串编号（array 'I'），id 用 array 'q'
+- 列表列：扁平的字符串编号数组 + 每条菜谱的起止偏移
+- 键的顺序/是否存在记在 shape 表里，不认识的字段整体存成 JSON 字符串
+
+缓冲区可以来自内存，也可以直接 mmap 一个文件：多个 worker mmap 同一个文件时
+共用操作系统的页缓存；用 gunicorn --preload 时内存里的缓冲区也是写时复制共享的，
+因为这里没有逐条的 Python 对象，引用计数不会弄脏这些页。
+RecipeView 是 __slots__ 视图，访问时才解码，对外表现为一个只读 Mapping。
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'RCPC'
+FORMAT_VERSION = 1
+NONE = 0xFFFFFFFF
+
+SCALAR_FIELDS = ('name', 'category', 'calories', 'season', 'festival')
+LIST_FIELDS = ('meal_type', 'ingredients', 'steps', 'tags')
+
+_HEADER = struct.Struct('<4sII')  # magic, 格式版本, 目录 JSON 长度
+
+
+class _Builder:
+    def __init__(self):
+        self.strings = {}
+        self.blob = bytearray()
+        self.str_offsets = array('I', [0])
+
+    def intern(self, text):
+        sid = self.strings.get(text)
+        if sid is None:
+            sid = self.strings[text] = len(self.strings)
+            self.blob += text.encode('utf-8')
+            self.str_offsets.append(len(self.blob))
+        return sid
+
+
+def pack_recipes(recipes, meta=None, extra_sections=()):
+    """把菜谱 dict 列表打包成紧凑二进制（bytes）；extra_sections 为附加的 (名称, array/bytes)，
+    例如编译产物里预先算好的索引"""
+    b = _Builder()
+    ids = array('q')
+    shape_ids = array('I')
+    shapes = {}
+    extras = array('I')
+    scalars = {f: array('I') for f in SCALAR_FIELDS}
+    lists = {f: (array('I'), array('I', [0])) for f in LIST_FIELDS}
+
+    for r in recipes:
+        shape_ids.append(shapes.setdefault(tuple(r.keys()), len(shapes)))
+        ids.append(int(r['id']))
+        extra = {k: v for k, v in r.items()
+                 if k != 'id' and k not in SCALAR_FIELDS and k not in LIST_FIELDS}
+
+        for f in SCALAR_FIELDS:
+            value = r.get(f)
+            if isinstance(value, str):
+                scalars[f].append(b.intern(value))
+            else:
+                scalars[f].append(NONE)
+                if f in r:
+                    extra[f] = value
+
+        for f in LIST_FIELDS:
+            flat, offsets = lists[f]
+            value = r.get(f)
+            if isinstance(value, list) and all(isinstance(x, str) for x in value):
+                flat.extend(b.intern(x) for x in value)
+            elif f in r:
+                extra[f] = value
+            offsets.append(len(flat))
+
+        extras.append(b.intern(json.dumps(extra, ensure_ascii=False)) if extra else NONE)
+
+    sections = [('str_offsets', b.str_offsets), ('ids', ids), ('shape_ids', shape_ids),
+                ('extras', extras), ('blob', bytes(b.blob))]
+    sections += [(f'scalar:{f}', scalars[f]) for f in SCALAR_FIELDS]
+    for f in LIST_FIELDS:
+        sections += [(f'list:{f}', lists[f][0]), (f'offsets:{f}', lists[f][1])]
+    sections += list(extra_sections)
+
+    directory = {"count": len(ids), "shapes": [list(s) for s in shapes], "meta": meta or {},
+                 "sections": {}}
+    body = bytearray()
+    for name, data in sections:
+        while len(body) % 8:
+            body.append(0)
+        raw = data.tobytes() if isinstance(data, array) else data
+        directory["sections"][name] = [len(body), len(raw),
+                                       data.typecode if isinstance(data, array) else 'B']
+        body += raw
+
+    dir_bytes = json.dumps(directory, ensure_ascii=False).encode('utf-8')
+    head = _HEADER.pack(MAGIC, FORMAT_VERSION, len(dir_bytes)) + dir_bytes
+    head += b'\0' * (-len(head) % 8)
+    # 目录里的偏移相对于 body 起点
+    return head + bytes(body)
+
+
+class CompactRecipes(Sequence):
+    """紧凑菜谱集合，按下标返回 RecipeView"""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, version, dir_len = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC:
+            raise ValueError("不是紧凑菜谱文件")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"紧凑菜谱格式版本 {version} 不受支持（需要 {FORMAT_VERSION}）")
+        start = _HEADER.size
+        directory = json.loads(bytes(view[start:start + dir_len]).decode('utf-8'))
+        base = start + dir_len + (-(start + dir_len) % 8)
+
+        self.count = directory['count']
+        self.meta = directory['meta']
+        self.shapes = [tuple(s) for s in directory['shapes']]
+        sections = {}
+        for name, (offset, length, typecode) in directory['sections'].items():
+            sections[name] = view[base + offset:base + offset + length].cast(typecode)
+        self._blob = sections.pop('blob')
+        self._str_offsets = sections.pop('str_offsets')
+        self._ids = sections.pop('ids')
+        self._shape_ids = sections.pop('shape_ids')
+        self._extras = sections.pop('extras')
+        self._scalars = {f: sections.pop(f'scalar:{f}') for f in SCALAR_FIELDS}
+        self._lists = {f: (sections.pop(f'list:{f}'), sections.pop(f'offsets:{f}')) for f in LIST_FIELDS}
+        # 其余的是附加段（预先算好的索引等），交给各自的加载方
+        self.sections = sections
+
+    @classmethod
+    def from_recipes(cls, recipes, meta=None):
+        return cls(pack_recipes(recipes, meta))
+
+    @classmethod
+    def from_file(cls, path):
+        """mmap 只读打开，多个进程共享同一份页缓存"""
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def string(self, sid):
+        return str(self._blob[self._str_offsets[sid]:self._str_offsets[sid + 1]], 'utf-8')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [RecipeView(self, j) for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return RecipeView(self, i)
+
+    def _extra(self, i):
+        sid = self._extras[i]
+        return json.loads(self.string(sid)) if sid != NONE else None
+
+    def keys_of(self, i):
+        return self.shapes[self._shape_ids[i]]
+
+    def field(self, i, key):
+        """第 i 条菜谱的某个字段；不存在时抛 KeyError"""
+        if key not in self.keys_of(i):
+            raise KeyError(key)
+        if key == 'id':
+            return self._ids[i]
+        extra = self._extra(i)
+        if extra is not None and key in extra:
+            return extra[key]
+        if key in self._scalars:
+            sid = self._scalars[key][i]
+            return self.string(sid) if sid != NONE else None
+        flat, offsets = self._lists[key]
+        return [self.string(flat[j]) for j in range(offsets[i], offsets[i + 1])]
+
+    def to_dict(self, i):
+        return {k: self.field(i, k) for k in self.keys_of(i)}
+
+    def column(self, key):
+        """字段的字符串编号列，不解码：标量字段返回每条一个编号的数组（缺失为 NONE），
+        列表字段返回 (扁平编号数组, 偏移数组)。同一个字符串只有一个编号，调用方可以按编号缓存计算结果"""
+        if key in self._scalars:
+            return self._scalars[key]
+        return self._lists[key]
+
+
+class RecipeView(Mapping):
+    """一条菜谱的只读视图，只有两个槽位，不持有解码后的数据"""
+    __slots__ = ('_store', '_i')
+
+    def __init__(self, store, i):
+        self._store = store
+        self._i = i
+
+    def __getitem__(self, key):
+        return self._store.field(self._i, key)
+
+    def __iter__(self):
+        return iter(self._store.keys_of(self._i))
+
+    def __len__(self):
+        return len(self._store.keys_of(self._i))
+
+    def __contains__(self, key):
+        return key in self._store.keys_of(self._i)
+
+    def to_dict(self):
+        return self._store.to_dict(self._i)
+
+    def __repr__(self):
+        return f"RecipeView({self.to_dict()!r})"
+
+
+class Ragged(Sequence):
+    """变长列表的列：第 i 项是 flat[offsets[i]:offsets[i + 1]]（缓冲区上的切片，不复制）"""
+    __slots__ = ('flat', 'offsets')
+
+    def __init__(self, flat, offsets):
+        self.flat = flat
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.flat[self.offsets[i]:self.offsets[i + 1]]
+
+
+def pack_ragged(name, rows, typecode='I'):
+    """把若干整数序列（或 bytes）打包成 name:flat / name:offsets 两段"""
+    if typecode == 'B':
+        flat = bytearray()
+    else:
+        flat = array(typecode)
+    offsets = array('Q', [0])
+    for row in rows:
+        flat.extend(row)
+        offsets.append(len(flat))
+    return [(f'{name}:flat', bytes(flat) if typecode == 'B' else flat), (f'{name}:offsets', offsets)]
+
+
+def load_ragged(sections, name):
+    return Ragged(sections[f'{name}:flat'], sections[f'{name}:offsets'])
+
+
+def pack_keys(name, keys):
+    """字符串列表，每个后面跟一个 \0，存成一段"""
+    return [(f'{name}:keys', ''.join(f'{k}\0' for k in keys).encode('utf-8'))]
+
+
+def load_keys(sections, name):
+    raw = sections[f'{name}:keys']
+    return str(raw, 'utf-8').split('\0')[:-1]
+
+
+class PostingTable(Mapping):
+    """只读的 字符串 -> 下标序列 倒排表。下标序列是缓冲区上的切片；
+    键到位置的字典在第一次查询时才建，启动时不做任何解码"""
+
+    def __init__(self, sections, name):
+        self._sections = sections
+        self._name = name
+        self._rows = load_ragged(sections, name)
+        self._index = None
+
+    def _positions(self):
+        if self._index is None:
+            self._index = {k: i for i, k in enumerate(load_keys(self._sections, self._name))}
+        return self._index
+
+    def __getitem__(self, key):
+        return self._rows[self._positions()[key]]
+
+    def __iter__(self):
+        return iter(self._positions())
+
+    def __len__(self):
+        return len(self._rows)
+
+
+def pack_postings(name, table):
+    """把 dict 形式的倒排表打包成 PostingTable 能读取的段"""
+    keys = list(table)
+    return pack_keys(name, keys) + pack_ragged(name, (table[k] for k in keys))
+
+
+def write_compact_file(recipes, path, meta=None, extra_sections=()):
+    """原子写入紧凑文件（先写临时文件再替换），多个进程同时写也安全"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(pack_recipes(recipes, meta, extra_sections))
+    os.replace(tmp, path)
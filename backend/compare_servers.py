@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+同步（gunicorn app:app）与异步（uvicorn asgi:app）两种部署方式的对比压测
+
+用法:
+    python compare_servers.py                                 默认 2 个 worker、64 并发、上游耗时 1 秒
+    python compare_servers.py -w 4 -c 128 --delay 2 -n 400
+    python compare_servers.py --recipes /tmp/recipes_100k.json
+
+脚本会先起一个本地的大模型桩服务（流式返回，总耗时 --delay 秒），
+再用同样的 worker 数分别启动两种服务，依次跑三个场景：
+- 本地搜索：关键词能在菜谱里搜到，不调用 AI
+- AI 补充：搜一个本地没有的词，再连上 stream_url 等 SSE 的 done 事件，计整个过程
+- 本地搜索（同时有 AI 流）：一半并发不停地跑 AI 补充，另一半测本地搜索的延迟
+同步版本按 gunicorn.conf.py 用 gthread worker，每条 SSE 连接占一个线程，线程数（GUNICORN_THREADS）
+和 AI 线程池（AI_JOB_WORKERS / AI_JOB_MAX_PENDING）是上限；异步版本等待时不占线程。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from benchmark import percentile, search_keywords
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class StubLLM(BaseHTTPRequestHandler):
+    """OpenAI 兼容的 chat/completions 桩：流式请求分几段返回，总耗时为 server.delay 秒"""
+    protocol_version = 'HTTP/1.1'
+    tokens = ['第一步，', '准备食材；', '第二步，', '下锅翻炒；', '完成。']
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        delay = self.server.delay
+        if not body.get('stream'):
+            time.sleep(delay)
+            out = json.dumps({"choices": [{"message": {"content": ''.join(self.tokens)}}]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def chunk(data):
+            self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+            self.wfile.flush()
+
+        for token in self.tokens:
+            time.sleep(delay / len(self.tokens))
+            delta = {"choices": [{"delta": {"content": token}}]}
+            chunk(f"data: {json.dumps(delta, ensure_ascii=False)}\n\n".encode('utf-8'))
+        chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+def start_stub(delay):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubLLM)
+    server.daemon_threads = True
+    server.delay = delay
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_command(mode, port, workers):
+    if mode == 'sync':
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                '--workers', str(workers), '--backlog', '2048']
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--no-access-log', '--backlog', '2048']
+
+
+def start_server(mode, workers, env):
+    port = free_port()
+    log = open(os.path.join(env['BENCH_TMP'], f'{mode}.log'), 'w')
+    proc = subprocess.Popen(server_command(mode, port, workers), cwd=BASE_DIR, env=env,
+                            stdout=log, stderr=subprocess.STDOUT)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{mode} 服务启动失败，见 {log.name}")
+        try:
+            if requests.get(f'{url}/api/health', timeout=1).status_code == 200:
+                return proc, url
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError(f"{mode} 服务启动超时")
+
+
+class Flows:
+    """一次完整的用户操作；每个线程一个 requests.Session"""
+
+    def __init__(self, url, keywords, tag):
+        self.url = url
+        self.keywords = keywords
+        self.tag = tag
+        self._local = threading.local()
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def local_search(self, rng):
+        r = self._session().post(f'{self.url}/api/search', json={"keyword": rng.choice(self.keywords)}, timeout=120)
+        return r.status_code == 200
+
+    def ai_search(self, rng):
+        with self._lock:
+            self._counter += 1
+            n = self._counter
+        # 每次一个新词：本地搜不到、AI 缓存也没有，一定会请求上游
+        keyword = f'不存在的菜{self.tag}{n}'
+        session = self._session()
+        data = session.post(f'{self.url}/api/search', json={"keyword": keyword}, timeout=120).json()
+        job = data.get('ai_job')
+        if not job:
+            return data.get('api_response') is not None
+        with session.get(f"{self.url}{job['stream_url']}", stream=True, timeout=120) as r:
+            for line in r.iter_lines(decode_unicode=True):
+                if line == 'event: done':
+                    return True
+        return False
+
+
+def measure(flow, count, concurrency, seed):
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            ok = flow(rng)
+        except requests.RequestException:
+            ok = False
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            errors += not ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(count)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": count,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "rps": round(count / wall, 1),
+    }
+
+
+def measure_under_ai_load(flows, count, concurrency, seed):
+    """一半并发持续跑 AI 补充，另一半测本地搜索"""
+    stop = threading.Event()
+
+    def background():
+        rng = random.Random(seed)
+        while not stop.is_set():
+            try:
+                flows.ai_search(rng)
+            except requests.RequestException:
+                pass
+
+    threads = [threading.Thread(target=background, daemon=True) for _ in range(max(concurrency // 2, 1))]
+    for t in threads:
+        t.start()
+    time.sleep(1)
+    try:
+        return measure(flows.local_search, count, max(concurrency - len(threads), 1), seed)
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
+
+
+def run_mode(mode, args, env, keywords):
+    proc, url = start_server(mode, args.workers, env)
+    try:
+        flows = Flows(url, keywords, mode)
+        measure(flows.local_search, 50, 4, args.seed)  # 预热
+        return {
+            "本地搜索": measure(flows.local_search, args.requests, args.concurrency, args.seed),
+            "AI补充(搜索+SSE)": measure(flows.ai_search, args.requests, args.concurrency, args.seed),
+            "本地搜索(同时有AI流)": measure_under_ai_load(flows, args.requests, args.concurrency, args.seed),
+        }
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同步 / 异步部署对比压测")
+    parser.add_argument('-w', '--workers', type=int, default=2, help="两种服务的 worker 进程数")
+    parser.add_argument('-c', '--concurrency', type=int, default=64, help="并发连接数")
+    parser.add_argument('-n', '--requests', type=int, default=200, help="每个场景的请求数")
+    parser.add_argument('--delay', type=float, default=1.0, help="桩服务生成一次回复的耗时（秒）")
+    parser.add_argument('--recipes', help="菜谱文件，默认使用服务自己的数据")
+    parser.add_argument('--only', choices=['sync', 'asgi'], help="只测一种")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="输出 JSON 而不是表格")
+    args = parser.parse_args()
+
+    stub = start_stub(args.delay)
+    tmp = tempfile.mkdtemp(prefix='compare_servers_')
+    env = dict(os.environ,
+               SILICONFLOW_API_KEY='bench',
+               SILICONFLOW_BASE_URL=f'http://127.0.0.1:{stub.server_port}',
+               SILICONFLOW_READ_TIMEOUT='60',
+               RECIPES_RELOAD_INTERVAL='0',
+               METRICS_DIR='',
+               BENCH_TMP=tmp)
+    if args.recipes:
+        env['RECIPES_PATH'] = os.path.abspath(args.recipes)
+
+    keywords = search_keywords()[:-2]  # 去掉故意搜不到的词
+    results = {"meta": {"workers": args.workers, "concurrency": args.concurrency, "requests": args.requests,
+                        "upstream_delay": args.delay}, "modes": {}}
+    try:
+        for mode in ('sync', 'asgi'):
+            if args.only and args.only != mode:
+                continue
+            env['AI_CACHE_PATH'] = os.path.join(tmp, f'{mode}_ai_cache.sqlite3')
+            results['modes'][mode] = run_mode(mode, args, env, keywords)
+    finally:
+        stub.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    meta = results['meta']
+    print(f"worker: {meta['workers']}  并发: {meta['concurrency']}  每场景请求: {meta['requests']}  "
+          f"上游耗时: {meta['upstream_delay']:g}s")
+    print(f"{'场景':<16}{'模式':>6}{'请求':>7}{'错误':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'rps':>9}")
+    scenarios = next(iter(results['modes'].values()), {})
+    for name in scenarios:
+        for mode, rows in results['modes'].items():
+            r = rows[name]
+            print(f"{name:<16}{mode:>6}{r['requests']:>7}{r['errors']:>6}{r['p50_ms']:>10}{r['p95_ms']:>10}"
+                  f"{r['p99_ms']:>10}{r['rps']:>9}")
+
+
+if __name__ == '__main__':
+    main()
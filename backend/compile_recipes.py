@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+把 recipes.json 编译成带索引的二进制产物（部署时运行一次）
+
+用法:
+    python compile_recipes.py                                  app 会加载的 recipes.json -> data/recipes.rcpc
+    python compile_recipes.py -i /tmp/recipes_100k.json -o /tmp/recipes_100k.rcpc
+    python compile_recipes.py --check                          只校验，不写文件
+    python compile_recipes.py --if-stale                       产物已是最新时跳过
+
+编译步骤：校验字段类型、拒绝重复 id、规整字段（去掉首尾空白和空条目，单个餐次写成列表），
+然后把菜谱记录、搜索倒排表、推荐分面、食材位图和每道菜的 JSON 片段写进同一个文件。
+app.py 启动时优先 mmap 这个文件（见 RECIPES_ARTIFACT），各 worker 不再解析 JSON、不再建索引。
+默认的输入、输出与 app.py 的加载顺序相同（recipe_store.default_recipe_paths）：输入是没有产物时
+app 会加载的第一个 JSON（backend/recipes.json 优先于 data/recipes.json），输出是 app 查找的产物位置。
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+from compact_store import CompactRecipes, write_compact_file
+from recipe_store import (ARTIFACT_VERSION, RecipeSnapshot, RecipeValidationError, default_recipe_paths,
+                          find_recipes_file, validate_recipes)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ARTIFACT, *_JSON_PATHS = default_recipe_paths(BASE_DIR)
+DEFAULT_SOURCE = find_recipes_file(_JSON_PATHS) or os.path.join(BASE_DIR, 'data', 'recipes.json')
+
+TEXT_FIELDS = ('name', 'category', 'calories', 'season')
+LIST_FIELDS = ('meal_type', 'ingredients', 'steps', 'tags')
+
+
+def _clean_list(value, where):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(x, str) for x in value):
+        raise RecipeValidationError(f"{where} 必须是字符串列表")
+    return [x.strip() for x in value if x.strip()]
+
+
+def normalize_recipe(recipe, i):
+    """校验并规整一道菜；不认识的字段原样保留"""
+    if not isinstance(recipe, dict):
+        raise RecipeValidationError(f"第 {i} 项不是对象")
+    r = dict(recipe)
+    try:
+        r['id'] = int(r['id'])
+    except (KeyError, TypeError, ValueError):
+        raise RecipeValidationError(f"第 {i} 项 id 缺失或不是整数")
+    for field in TEXT_FIELDS:
+        if field in r and r[field] is not None:
+            if not isinstance(r[field], str):
+                raise RecipeValidationError(f"第 {i} 项 {field} 必须是字符串")
+            r[field] = r[field].strip()
+    for field in ('name', 'category'):
+        if not r.get(field):
+            raise RecipeValidationError(f"第 {i} 项缺少 {field}")
+    for field in LIST_FIELDS:
+        if field in r:
+            r[field] = _clean_list(r[field], f"第 {i} 项 {field}")
+    if not r.get('meal_type'):
+        raise RecipeValidationError(f"第 {i} 项 meal_type 为空，不会出现在任何推荐里")
+    return r
+
+
+def compile_recipes(source, output, check_only=False):
+    """返回 (菜谱数量, 版本)"""
+    with open(source, 'rb') as f:
+        raw = f.read()
+    recipes = json.loads(raw.decode('utf-8'))
+    if not isinstance(recipes, list):
+        raise RecipeValidationError("顶层必须是菜谱列表")
+    recipes = [normalize_recipe(r, i) for i, r in enumerate(recipes)]
+    validate_recipes(recipes)  # 与运行时加载 JSON 时相同的检查（包括 id 重复）
+    version = hashlib.sha1(raw).hexdigest()[:12]
+    if check_only:
+        return len(recipes), version
+
+    snapshot = RecipeSnapshot(recipes, version=version)
+    meta = {
+        "version": version,
+        "artifact": ARTIFACT_VERSION,
+        "source": os.path.relpath(os.path.abspath(source), os.path.dirname(os.path.abspath(output))),
+        "built_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    write_compact_file(recipes, output, meta, snapshot.index_sections())
+    return len(recipes), version
+
+
+def is_fresh(source, output):
+    """产物存在、比源文件新且版本一致"""
+    if not os.path.exists(output) or os.path.getmtime(output) < os.path.getmtime(source):
+        return False
+    try:
+        meta = CompactRecipes.from_file(output).meta
+    except Exception:
+        return False
+    return meta.get('artifact') == ARTIFACT_VERSION
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编译菜谱数据")
+    parser.add_argument('-i', '--input', help="菜谱 JSON，默认是 app 会加载的第一个 recipes.json")
+    parser.add_argument('-o', '--output', help="输出文件，默认 data/recipes.rcpc；指定 -i 时为与输入同名的 .rcpc")
+    parser.add_argument('--check', action='store_true', help="只校验，不写文件")
+    parser.add_argument('--if-stale', action='store_true', help="产物已是最新时跳过")
+    args = parser.parse_args()
+    if args.input is None:
+        args.input = DEFAULT_SOURCE
+        output = args.output or DEFAULT_ARTIFACT
+    else:
+        output = args.output or os.path.splitext(args.input)[0] + '.rcpc'
+
+    if args.if_stale and not args.check and is_fresh(args.input, output):
+        print(f"{output} 已是最新，跳过")
+        return
+
+    started = time.perf_counter()
+    try:
+        count, version = compile_recipes(args.input, output, check_only=args.check)
+    except (OSError, ValueError) as e:
+        print(f"编译失败: {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+    if args.check:
+        print(f"校验通过: {count} 道菜, 版本 {version}")
+    else:
+        print(f"已生成 {output}: {count} 道菜, 版本 {version}, "
+              f"{os.path.getsize(output) / 1024:.0f}KB, 耗时 {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
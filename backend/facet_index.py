@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+推荐用的分面索引
+
+加载时把菜谱按 (category, meal_type) 分桶，桶内再按季节、节日细分，
+推荐时只在桶内按下标抽样，排除已选菜谱用集合判断。
+"""
+import random
+
+from compact_store import PostingTable, pack_postings
+
+SEASONS = ["春季", "夏季", "秋季", "冬季"]
+
+
+def _sample_excluding(ids, k, exclude, rng):
+    """从 ids 中随机抽取 k 个不在 exclude 里的下标，代价约 O(k + len(exclude))"""
+    if k <= 0 or not ids:
+        return []
+    n = min(len(ids), k + len(exclude))
+    picked = [i for i in rng.sample(ids, n) if i not in exclude]
+    return picked[:k]
+
+
+class FacetBucket:
+    """同一 (category, meal_type) 下的菜谱下标"""
+
+    def __init__(self):
+        self.ids = []
+        self.by_season = {s: [] for s in SEASONS}
+        self.by_festival = {}
+
+    def add(self, idx, recipe):
+        self.ids.append(idx)
+        season = recipe.get('season', '全年')
+        for s in SEASONS:
+            if s in season:
+                self.by_season[s].append(idx)
+        festival = recipe.get('festival')
+        if isinstance(festival, list):
+            festival = '、'.join(festival)
+        if festival:
+            self.by_festival.setdefault(festival, []).append(idx)
+
+    def festival_ids(self, festival):
+        """菜谱 festival 字段包含该节日名的下标，保持原顺序"""
+        hits = []
+        for name, ids in self.by_festival.items():
+            if festival in name:
+                hits.extend(ids)
+        return sorted(hits)
+
+
+class FacetIndex:
+    """(category, meal_type) -> FacetBucket"""
+
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.buckets = {}
+        for idx, recipe in enumerate(recipes):
+            for meal in recipe.get('meal_type', []):
+                key = (recipe.get('category'), meal)
+                self.buckets.setdefault(key, FacetBucket()).add(idx, recipe)
+
+    @classmethod
+    def from_sections(cls, recipes, sections):
+        """从编译产物恢复分桶，桶内下标直接引用缓冲区"""
+        index = cls.__new__(cls)
+        index.recipes = recipes
+        index.buckets = {}
+        table = PostingTable(sections, 'facets')
+        for key in table:
+            category, meal, kind = key.split('\t')
+            bucket = index.buckets.setdefault((category, meal), FacetBucket())
+            if kind == '':
+                bucket.ids = table[key]
+            elif kind.startswith('s:'):
+                bucket.by_season[kind[2:]] = table[key]
+            else:
+                bucket.by_festival[kind[2:]] = table[key]
+        return index
+
+    def to_sections(self):
+        table = {}
+        for (category, meal), bucket in self.buckets.items():
+            prefix = f"{category}\t{meal}\t"
+            table[prefix] = bucket.ids
+            for season, ids in bucket.by_season.items():
+                table[f"{prefix}s:{season}"] = ids
+            for festival, ids in bucket.by_festival.items():
+                table[f"{prefix}f:{festival}"] = ids
+        return pack_postings('facets', table)
+
+    def recommend_ids(self, diet_type, meal_time, festivals, season, limit, rng=random):
+        """按 节日 -> 时令 -> 随机补齐 的优先级返回至多 limit 个下标"""
+        bucket = self.buckets.get((diet_type, meal_time))
+        if bucket is None:
+            return []
+
+        chosen = []
+        chosen_set = set()
+        # 节日优先
+        for f in festivals:
+            for idx in bucket.festival_ids(f):
+                if idx not in chosen_set:
+                    chosen.append(idx)
+                    chosen_set.add(idx)
+
+        # 时令优先
+        seasonal = bucket.by_season.get(season, [])
+        for idx in _sample_excluding(seasonal, limit - len(chosen), chosen_set, rng):
+            chosen.append(idx)
+            chosen_set.add(idx)
+
+        # 兜底：随机补齐
+        for idx in _sample_excluding(bucket.ids, limit - len(chosen), chosen_set, rng):
+            chosen.append(idx)
+            chosen_set.add(idx)
+
+        return chosen[:limit]
+
+    def recommend(self, diet_type, meal_time, festivals, season, limit, rng=random):
+        return [self.recipes[i] for i in
+                self.recommend_ids(diet_type, meal_time, festivals, season, limit, rng)]
+
+
+class PlanSampler:
+    """多天菜单抽样：每个候选池只洗牌一次，之后依次取用；
+    整份计划内不重复，某个池子全部用过一轮后才开始重复"""
+
+    def __init__(self, index, rng=random):
+        self.index = index
+        self.rng = rng
+        self.used = set()
+        self._decks = {}
+
+    def _new_deck(self, key, pool, skip):
+        deck = [i for i in pool if i not in skip]
+        self.rng.shuffle(deck)
+        self._decks[key] = deck
+        return deck
+
+    def _draw(self, key, pool, k, chosen_set, refill):
+        picked = []
+        deck = self._decks.get(key)
+        if deck is None:
+            deck = self._new_deck(key, pool, self.used)
+        while len(picked) < k:
+            if not deck:
+                if not refill:
+                    break
+                # 整个分面都用过了：开始新一轮，时令牌堆也一起重洗（当天已选的仍不重复）
+                refill = False
+                self.used.difference_update(pool)
+                for old in [d for d in self._decks if d[0] == key[0]]:
+                    del self._decks[old]
+                deck = self._new_deck(key, pool, chosen_set)
+                continue
+            idx = deck.pop()
+            if idx in self.used or idx in chosen_set:
+                continue
+            picked.append(idx)
+            chosen_set.add(idx)
+            self.used.add(idx)
+        return picked
+
+    def pick(self, diet_type, meal_time, festivals, season, limit):
+        """与 FacetIndex.recommend_ids 相同的 节日 -> 时令 -> 补齐 优先级"""
+        key = (diet_type, meal_time)
+        bucket = self.index.buckets.get(key)
+        if bucket is None:
+            return []
+
+        chosen = []
+        chosen_set = set()
+        # 节日菜当天一定出现，不受去重限制
+        for f in festivals:
+            for idx in bucket.festival_ids(f):
+                if idx not in chosen_set:
+                    chosen.append(idx)
+                    chosen_set.add(idx)
+                    self.used.add(idx)
+
+        seasonal = bucket.by_season.get(season, [])
+        chosen += self._draw((key, season), seasonal, limit - len(chosen), chosen_set, refill=False)
+        chosen += self._draw((key, None), bucket.ids, limit - len(chosen), chosen_set, refill=True)
+        return chosen[:limit]
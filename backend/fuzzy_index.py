@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+菜名的拼音 / 近似拼写候选索引
+
+对一组不重复的字符串（菜名，或菜名的全拼、首字母）建立 n 元组 -> 字符串编号 的倒排表：
+- contains(q)：求倒排表交集后逐个校验子串，用于拼音匹配（hongshaorou、hsr）
+- near(q, d)：q-gram 计数过滤——q 与某个子串的编辑距离不超过 d 时，
+  q 的不重复 n 元组至少有 len(grams) - n*d 个也出现在该字符串里；
+  按共享数筛出少量候选后再逐个算有界编辑距离
+pypinyin 是可选依赖，没装时 pinyin_keys 返回 None，只是没有拼音索引。
+它的词典占五十多 MB 内存，只在建索引时用到，所以第一次调用 pinyin_keys 才导入；
+加载编译产物时拼音已经算好，worker 里不会导入。
+"""
+from collections import Counter
+
+from compact_store import PostingTable, load_keys, pack_keys, pack_postings
+
+# 近似匹配时最多校验的候选数
+MAX_CANDIDATES = 400
+
+_lazy_pinyin = None  # 尚未导入；导入失败时为 False
+
+
+def pinyin_keys(text):
+    """(全拼, 首字母)，如 红烧肉 -> ('hongshaorou', 'hsr')；没有 pypinyin 时返回 None"""
+    global _lazy_pinyin
+    if _lazy_pinyin is None:
+        try:
+            from pypinyin import lazy_pinyin as _lazy_pinyin
+        except ImportError:  # 可选依赖
+            _lazy_pinyin = False
+    lazy_pinyin = _lazy_pinyin
+    if not lazy_pinyin:
+        return None
+    syllables = [s for s in lazy_pinyin(text, errors='ignore') if s.isalpha()]
+    return ''.join(syllables), ''.join(s[0] for s in syllables)
+
+
+def _ngrams(text, n):
+    if len(text) <= n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def substring_distance(query, text, max_dist):
+    """query 与 text 的某个子串之间的最小编辑距离；超过 max_dist 时返回 None"""
+    m = len(query)
+    # col[i] = query[:i] 与 "以当前位置结尾的某个子串" 的最小编辑距离，子串起点任意
+    col = list(range(m + 1))
+    best = col[m]
+    for ch in text:
+        prev_diag, col[0] = col[0], 0
+        for i in range(1, m + 1):
+            cur = min(col[i] + 1, col[i - 1] + 1, prev_diag + (query[i - 1] != ch))
+            prev_diag, col[i] = col[i], cur
+        if col[m] < best:
+            best = col[m]
+            if best == 0:
+                break
+    return best if best <= max_dist else None
+
+
+class GramIndex:
+    """不重复字符串的 n 元组倒排表（只读）"""
+
+    def __init__(self, strings, n=1):
+        self.n = n
+        self._strings = list(strings)
+        self._keys = None
+        postings = {}
+        for sid, text in enumerate(self._strings):
+            for g in _ngrams(text, n):
+                postings.setdefault(g, []).append(sid)
+        self.postings = postings
+
+    @classmethod
+    def from_sections(cls, sections, name, n):
+        index = cls.__new__(cls)
+        index.n = n
+        index._strings = None
+        index._keys = (sections, name)
+        index.postings = PostingTable(sections, f'{name}:grams')
+        return index
+
+    def to_sections(self, name):
+        return pack_keys(f'{name}:strings', self.strings) + pack_postings(f'{name}:grams', self.postings)
+
+    @property
+    def strings(self):
+        # 编译产物里的字符串表第一次用到时才解码
+        if self._strings is None:
+            sections, name = self._keys
+            self._strings = load_keys(sections, f'{name}:strings')
+        return self._strings
+
+    def contains(self, query):
+        """包含 query 的字符串编号（升序）"""
+        grams = _ngrams(query, self.n)
+        if not grams:
+            return []
+        postings = []
+        for g in grams:
+            plist = self.postings.get(g)
+            if not plist:
+                return []
+            postings.append(plist)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for plist in postings[1:]:
+            result.intersection_update(plist)
+            if not result:
+                return []
+        strings = self.strings
+        return sorted(sid for sid in result if query in strings[sid])
+
+    def near(self, query, max_dist):
+        """与 query 的编辑距离（按子串计）不超过 max_dist 的 [(编号, 距离)]，按距离升序"""
+        grams = _ngrams(query, self.n)
+        threshold = len(grams) - self.n * max_dist
+        if threshold < 1:
+            return []
+        counts = Counter()
+        for g in grams:
+            counts.update(self.postings.get(g, ()))
+        candidates = [sid for sid, c in counts.most_common(MAX_CANDIDATES) if c >= threshold]
+        strings = self.strings
+        hits = []
+        for sid in candidates:
+            dist = substring_distance(query, strings[sid], max_dist)
+            if dist is not None:
+                hits.append((sid, dist))
+        hits.sort(key=lambda h: (h[1], h[0]))
+        return hits
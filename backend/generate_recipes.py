@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 生成200道菜的数据库（100道中餐 + 100道地中海饮食）
+
+用法:
+    python generate_recipes.py                         输出精选菜谱到 backend/data/recipes.json
+    python generate_recipes.py --count 100k -o big.json  生成10万道合成菜谱（压测用）
 """
+import argparse
 import json
+import os
+import random
+import time
 
 # 中餐菜谱（100道）
 chinese_recipes = [
@@ -201,10 +209,121 @@ mediterranean_recipes = [
 # 合并所有菜谱
 all_recipes = chinese_recipes + mediterranean_recipes
 
-# 保存为JSON文件
-with open('D:/AItest/recipe-app/backend/data/recipes.json', 'w', encoding='utf-8') as f:
-    json.dump(all_recipes, f, ensure_ascii=False, indent=2)
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, 'data', 'recipes.json')
+
+# --- 合成大规模菜谱库（压测用） ---
+# 以上面的精选菜谱为模板，食材/标签按它们在精选库里的出现频率抽样，
+# 字段结构（category / meal_type / season / festival / 带用量的食材）与真实数据一致。
+NAME_PREFIXES = ['', '', '', '家常', '秘制', '农家', '老式', '川味', '湘味', '粤式', '快手', '简易', '经典', '妈妈的']
+NAME_SUFFIXES = ['', '', '', '', '（少油版）', '（改良版）', '（下饭版）', '（清淡版）']
+SCALES = [0.5, 0.75, 1, 1, 1, 1.25, 1.5, 2]
+
+
+def split_ingredient(text):
+    """"小米 100g" -> ("小米", "100g")；没有用量时用量为空"""
+    name, _, amount = text.partition(' ')
+    return name, amount
+
+
+def random_amount(rng, amount):
+    """保持原来的单位，把数量随机放大或缩小；没有数字的用量（如“适量”）原样保留"""
+    digits = amount[:len(amount) - len(amount.lstrip('0123456789'))]
+    if not digits:
+        return amount
+    value = int(digits) * rng.choice(SCALES)
+    value = max(1, int(round(value / 5) * 5) if value >= 20 else int(round(value)))
+    return f"{value}{amount[len(digits):]}"
+
+
+def synthetic_recipes(count, seed=42, start_id=1):
+    """按需逐条生成 count 道合成菜谱（生成器，100万条也不占多少内存）"""
+    rng = random.Random(seed)
+    templates = all_recipes
+    # 食材与标签的经验分布：出现次数越多越容易被抽到
+    vocab = [split_ingredient(ing) for r in templates for ing in r['ingredients']]
+    tags = [t for r in templates for t in r.get('tags', [])]
+
+    for i in range(count):
+        t = rng.choice(templates)
+        ingredients = [split_ingredient(ing) for ing in t['ingredients']]
+        # 一半的菜换掉一个食材，三分之一的菜多加一个
+        if len(ingredients) > 2 and rng.random() < 0.5:
+            ingredients[rng.randrange(1, len(ingredients))] = rng.choice(vocab)
+        if rng.random() < 0.33:
+            ingredients.append(rng.choice(vocab))
+        seen = set()
+        ingredient_texts = []
+        for name, amount in ingredients:
+            if name in seen:
+                continue
+            seen.add(name)
+            amount = random_amount(rng, amount) if amount else ''
+            ingredient_texts.append(f"{name} {amount}" if amount else name)
+
+        recipe = {
+            "id": start_id + i,
+            "name": f"{rng.choice(NAME_PREFIXES)}{t['name']}{rng.choice(NAME_SUFFIXES)}",
+            "category": t['category'],
+            "meal_type": list(t['meal_type']),
+            "ingredients": ingredient_texts,
+            "steps": list(t['steps']),
+            "calories": t['calories'],
+            "season": t['season'],
+        }
+        if t.get('festival'):
+            recipe["festival"] = t['festival']
+        recipe["tags"] = list(dict.fromkeys(t.get('tags', []) + ([rng.choice(tags)] if rng.random() < 0.3 else [])))
+        yield recipe
+
+
+def write_recipes(recipes, path, indent=None):
+    """逐条写出 JSON 数组，先写临时文件再替换，返回写入条数"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    count = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        if indent is not None:
+            recipes = list(recipes)
+            json.dump(recipes, f, ensure_ascii=False, indent=indent)
+            count = len(recipes)
+        else:
+            f.write('[\n')
+            for r in recipes:
+                f.write(',\n' if count else '')
+                f.write(json.dumps(r, ensure_ascii=False))
+                count += 1
+            f.write('\n]\n')
+    os.replace(tmp, path)
+    return count
+
+
+def parse_count(text):
+    """支持 1000 / 10k / 1m 这样的写法"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成菜谱数据库")
+    parser.add_argument('--count', type=parse_count, default=0,
+                        help="生成多少道合成菜谱，如 1k / 10k / 100k / 1m；不填则输出精选菜谱")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子，相同种子生成相同数据")
+    parser.add_argument('--output', '-o', default=DEFAULT_OUTPUT, help=f"输出路径，默认 {DEFAULT_OUTPUT}")
+    args = parser.parse_args()
+
+    if not args.count:
+        write_recipes(all_recipes, args.output, indent=2)
+        print(f"成功生成 {len(all_recipes)} 道菜谱！")
+        print(f"中餐：{len(chinese_recipes)} 道")
+        print(f"地中海：{len(mediterranean_recipes)} 道")
+        return
+
+    started = time.perf_counter()
+    count = write_recipes(synthetic_recipes(args.count, args.seed), args.output)
+    print(f"成功生成 {count} 道合成菜谱 -> {args.output}（{time.perf_counter() - started:.1f}s）")
+
 
-print(f"成功生成 {len(all_recipes)} 道菜谱！")
-print(f"中餐：{len(chinese_recipes)} 道")
-print(f"地中海：{len(mediterranean_recipes)} 道")
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 配置：在 backend 目录下启动时自动加载（./gunicorn.conf.py），命令行参数优先
+
+默认用 gthread worker：每个连接占一个线程，而不是整个 worker。
+AI 补充的 SSE 连接（/api/search/ai/<id>/stream）要挂住直到上游生成完，
+用 sync worker 时一条 SSE 连接就占满一个 worker，本地搜索只能排队等上游。
+
+GUNICORN_WORKER_CLASS  worker 类型，默认 gthread
+GUNICORN_THREADS       每个 worker 的线程数，默认 16（同时挂住的 SSE 连接数上限也是它）
+
+post_worker_init 在每个 worker 里启动菜谱热加载，加不加 --preload 都有效（见 recipe_store.py）。
+on_starting 清空 METRICS_DIR，/api/metrics 只汇总本次启动的 worker（见 metrics.py）。
+"""
+import os
+import sys
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+
+def on_starting(server):
+    """master 启动时（导入 app 之前）清掉上一次运行留下的监控数据"""
+    from metrics import clear_directory
+    clear_directory(os.environ.get('METRICS_DIR'))
+
+
+def post_worker_init(worker):
+    """worker 初始化完成后在主线程里调用，此时 gunicorn 已经重置过信号处理，可以注册 SIGHUP"""
+    app = sys.modules.get('app')
+    if app is not None and hasattr(app, 'start_watching'):
+        app.start_watching()
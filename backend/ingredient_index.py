@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+"用手头的食材做菜" 用的食材位图索引
+
+加载时把 "小米 100g"、"红枣 5颗"、"白糖适量" 这类自由文本归一成标准食材名
+（去掉用量和单位、合并同义词、拆开 "葱姜蒜" 这样的组合），每个标准食材一个编号，
+每道菜一个整数位图。查询时把冰箱里的食材也做成位图：
+命中数 = popcount(菜谱位图 & 冰箱位图)，缺少数 = 菜谱食材数 - 命中数，
+只对至少命中一样食材的菜谱打分，用堆取前 k 个，不做全量排序。
+"""
+import heapq
+import re
+from array import array
+from collections.abc import Sequence
+
+from compact_store import load_keys, load_ragged, pack_keys, pack_ragged
+
+# 同义词 -> 标准名
+SYNONYMS = {
+    '西红柿': '番茄', '小番茄': '番茄', '圣女果': '番茄',
+    '马铃薯': '土豆', '洋芋': '土豆', '小土豆': '土豆',
+    '大蒜': '蒜', '蒜头': '蒜', '蒜瓣': '蒜',
+    '生姜': '姜', '老姜': '姜',
+    '大葱': '葱', '小葱': '葱', '香葱': '葱',
+    '白糖': '糖', '白砂糖': '糖', '砂糖': '糖',
+    '土豆淀粉': '淀粉', '玉米淀粉': '淀粉', '生粉': '淀粉',
+    '鸡蛋清': '鸡蛋', '鸡蛋黄': '鸡蛋', '蛋': '鸡蛋',
+    '黄酒': '料酒', '绍兴酒': '料酒',
+    '虾仁': '虾', '鲜虾': '虾',
+    '猪肉馅': '猪肉', '肉馅': '猪肉', '瘦肉': '猪肉',
+    '花菇': '香菇', '冬菇': '香菇',
+    '红洋葱': '洋葱',
+    '甜椒': '彩椒',
+    '生抽': '酱油', '老抽': '酱油',
+    '食用油': '油', '植物油': '油',
+    '清水': '水', '温水': '水', '开水': '水',
+}
+
+# 默认视为家里常备、不计入 "缺少" 的调味品
+STAPLES = frozenset(['盐', '油', '水', '糖', '酱油', '醋', '料酒', '淀粉', '胡椒粉', '香油', '鸡精', '味精'])
+
+# 刀工后缀：去掉后是已知食材才认，避免把 "西兰花" 拆成 "西兰"
+_CUT_SUFFIXES = ('丝', '末', '花', '片', '丁', '碎', '块', '段', '汁')
+_AMOUNT_WORDS = re.compile(r'(适量|少许|若干)$')
+_AROMATICS = set('葱姜蒜')
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(mask):
+        """整数位图中 1 的个数"""
+        return bin(mask).count('1')
+
+
+def _base_name(text):
+    """去掉用量和单位：'红枣 5颗' -> '红枣'，'白糖适量' -> '白糖'"""
+    parts = text.strip().split()
+    if not parts:
+        return ''
+    return _AMOUNT_WORDS.sub('', parts[0])
+
+
+def _canonical(name, vocabulary):
+    """单个食材名 -> 标准名列表（组合调料会拆成多个）"""
+    name = SYNONYMS.get(name, name)
+    if len(name) > 1 and set(name) <= _AROMATICS:
+        return list(dict.fromkeys(name))
+    for suffix in _CUT_SUFFIXES:
+        if name.endswith(suffix) and len(name) > 1:
+            stem = SYNONYMS.get(name[:-1], name[:-1])
+            if set(stem) <= _AROMATICS:
+                return list(dict.fromkeys(stem))
+            if stem in vocabulary:
+                return [stem]
+    return [name]
+
+
+class IngredientIndex:
+    """标准食材编号 + 每道菜的食材位图（只读，构建后不再修改）"""
+
+    def __init__(self, recipes):
+        self.recipes = recipes
+        raw = [[_base_name(ing) for ing in recipe.get('ingredients', [])] for recipe in recipes]
+        # 先收集所有出现过的名字（同义词取标准名），刀工后缀只在去掉后仍是已知食材时才剥掉
+        vocabulary = {SYNONYMS.get(name, name) for names in raw for name in names if name}
+        self._vocabulary = vocabulary
+        self.ids = {}
+        self.names = []
+        self.masks = []
+        self.sizes = []
+        postings = {}
+        memo = {}
+        for idx, names in enumerate(raw):
+            mask = 0
+            for name in names:
+                if not name:
+                    continue
+                bits = memo.get(name)
+                if bits is None:
+                    bits = memo[name] = self._mask_of(_canonical(name, vocabulary), create=True)
+                mask |= bits
+            self.masks.append(mask)
+            self.sizes.append(popcount(mask))
+            for iid in _bit_positions(mask):
+                postings.setdefault(iid, []).append(idx)
+        self.postings = [postings.get(iid, []) for iid in range(len(self.names))]
+        self.staple_mask = self._mask_of([s for s in STAPLES if s in self.ids])
+
+    @classmethod
+    def from_sections(cls, recipes, sections):
+        """从编译产物恢复：位图按固定宽度存放，用到哪条才转成整数"""
+        index = cls.__new__(cls)
+        index.recipes = recipes
+        index.names = load_keys(sections, 'ingredients:names')
+        index.ids = {name: i for i, name in enumerate(index.names)}
+        index._vocabulary = set(load_keys(sections, 'ingredients:vocabulary'))
+        index.sizes = sections['ingredients:sizes']
+        index.masks = _MaskColumn(sections['ingredients:masks'], _mask_width(len(index.names)), len(index.sizes))
+        index.postings = load_ragged(sections, 'ingredients:postings')
+        index.staple_mask = index._mask_of([s for s in STAPLES if s in index.ids])
+        return index
+
+    def to_sections(self):
+        width = _mask_width(len(self.names))
+        return (pack_keys('ingredients:names', self.names)
+                + pack_keys('ingredients:vocabulary', sorted(self._vocabulary))
+                + [('ingredients:sizes', array('H', self.sizes)),
+                   ('ingredients:masks', b''.join(m.to_bytes(width, 'little') for m in self.masks))]
+                + pack_ragged('ingredients:postings', self.postings))
+
+    def _mask_of(self, names, create=False):
+        mask = 0
+        for name in names:
+            iid = self.ids.get(name)
+            if iid is None:
+                if not create:
+                    continue
+                iid = self.ids[name] = len(self.names)
+                self.names.append(name)
+            mask |= 1 << iid
+        return mask
+
+    def normalize(self, items):
+        """把用户输入的食材归一，返回 (已知标准名列表, 不认识的输入列表)"""
+        known, unknown = [], []
+        for item in items:
+            name = _base_name(str(item))
+            if not name:
+                continue
+            names = [n for n in _canonical(name, self._vocabulary) if n in self.ids]
+            if names:
+                known.extend(n for n in names if n not in known)
+            else:
+                unknown.append(item)
+        return known, unknown
+
+    def names_of(self, mask):
+        return [self.names[i] for i in _bit_positions(mask)]
+
+    def top_k(self, pantry, k=10, assume_staples=True):
+        """按 覆盖率 降序、缺少食材数 升序 返回前 k 个 (下标, 命中位图, 缺少位图)
+
+        pantry 为标准名列表；assume_staples 时盐、油等调料视为已有。
+        只有至少命中一样非调料食材的菜谱才参与排序。"""
+        have = self._mask_of(pantry)
+        candidates = set()
+        for iid in _bit_positions(have & ~self.staple_mask):
+            candidates.update(self.postings[iid])
+        if not candidates:
+            return []
+        if assume_staples:
+            have |= self.staple_mask
+
+        masks, sizes = self.masks, self.sizes
+
+        def score(idx):
+            total = sizes[idx]
+            hit = popcount(masks[idx] & have)
+            # 覆盖率高的在前；同覆盖率缺得少的在前；再按原顺序
+            return hit / total, hit - total, -idx
+
+        best = heapq.nlargest(k, candidates, key=score)
+        return [(idx, masks[idx] & have, masks[idx] & ~have) for idx in best]
+
+
+def _mask_width(count):
+    return (count + 7) // 8
+
+
+class _MaskColumn(Sequence):
+    """定宽小端字节存放的位图列"""
+
+    def __init__(self, buffer, width, count):
+        self._buffer = buffer
+        self._width = width
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start = i * self._width
+        return int.from_bytes(self._buffer[start:start + self._width], 'little')
+
+
+def _bit_positions(mask):
+    """整数位图中为 1 的位编号（从低到高）"""
+    positions = []
+    while mask:
+        low = mask & -mask
+        positions.append(low.bit_length() - 1)
+        mask ^= low
+    return positions
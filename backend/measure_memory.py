@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+对比每个 worker 的真实内存（仅 Linux，读取 /proc/self/status 和 /proc/self/smaps_rollup）
+
+用法: python measure_memory.py [数量 ...]        默认 10000 100000
+
+每种方式在单独的子进程里 import app（与 gunicorn worker 加载的是同一个模块），
+再跑一轮推荐、搜索、食材匹配请求，让索引和缓存都真正用起来，然后报告：
+  RssAnon = 进程私有的匿名内存；不加 --preload 时 N 个 worker 就是 N 份
+  RssFile = 文件映射页，来自页缓存，多个 worker 共享同一份
+  preload = 模拟 gunicorn --preload：import 之后 fork 出一个 worker 跑同样的请求，
+            统计它的私有页（smaps_rollup 的 Private_Clean + Private_Dirty），即每多一个 worker 多占的内存
+数字包含解释器和依赖库本身；空进程的基线单独列在第一行。
+
+方式：
+  json     = RECIPES_PATH 指向 recipes.json，解析后建索引
+  memory   = 同上，RECIPES_COMPACT=memory
+  mmap     = 同上，RECIPES_COMPACT=mmap
+  artifact = compile_recipes.py 生成的 .rcpc，索引也在文件里
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODES = ('json', 'memory', 'mmap', 'artifact')
+
+
+def memory_status():
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'RssAnon', 'RssFile'):
+                fields[key] = round(int(value.split()[0]) / 1024, 1)
+    return fields
+
+
+def private_memory():
+    """本进程独占的页（MB）：fork 后还与父进程共享的写时复制页不算"""
+    total = 0
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Private_Clean', 'Private_Dirty'):
+                total += int(value.split()[0])
+    return round(total / 1024, 1)
+
+
+def exercise(app):
+    """跑一轮各接口，索引、缓存、惰性编码的 JSON 片段都会被用到"""
+    from benchmark import search_keywords
+
+    keywords = search_keywords()
+    client = app.test_client()
+    for diet_type in ('中餐', '西餐'):
+        client.get(f'/api/today?diet_type={diet_type}')
+    client.get('/api/plan?days=7')
+    for keyword in keywords[::10]:
+        client.post('/api/search', json={"keyword": keyword})
+    for i in range(0, 200, 4):
+        client.post('/api/pantry', json={"ingredients": keywords[i:i + 4], "limit": 10})
+
+
+def child():
+    """子进程：import app，跑一轮请求，再 fork 一个 worker 测 preload 时的私有内存"""
+    before = memory_status()
+    import app as core
+
+    exercise(core.app)
+    worker = memory_status()
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        exercise(core.app)
+        os.write(write_fd, json.dumps(private_memory()).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        preload = json.loads(f.read())
+    os.waitpid(pid, 0)
+    print(json.dumps({"before": before, "worker": worker, "preload": preload,
+                      "count": len(core.STORE.current().recipes)}))
+
+
+def run_child(env):
+    out = subprocess.run([sys.executable, __file__, '--child'], capture_output=True, text=True,
+                         check=True, cwd=BASE_DIR, env=env).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child()
+        return
+
+    from compile_recipes import compile_recipes
+    from generate_recipes import synthetic_recipes, write_recipes
+
+    sizes = [int(x) for x in sys.argv[1:]] or [10000, 100000]
+    print(f"{'数量':>8} {'方式':>9} {'VmRSS':>9} {'RssAnon':>9} {'RssFile':>9} {'preload':>9}  (MB, 每个worker)")
+    with tempfile.TemporaryDirectory() as tmp:
+        base_env = dict(os.environ, SILICONFLOW_API_KEY='', RECIPES_RELOAD_INTERVAL='0', METRICS_DIR='',
+                        PROFILE_SLOW_MS='0', AI_CACHE_PATH=os.path.join(tmp, 'ai_cache.sqlite3'))
+        base_env.pop('RECIPES_COMPACT', None)
+        baseline = None
+        for n in sizes:
+            json_path = os.path.join(tmp, f'recipes_{n}.json')
+            artifact_path = os.path.join(tmp, f'recipes_{n}.rcpc')
+            write_recipes(list(synthetic_recipes(n)), json_path)
+            compile_recipes(json_path, artifact_path)
+            for mode in MODES:
+                env = dict(base_env, RECIPES_PATH=artifact_path if mode == 'artifact' else json_path)
+                if mode in ('memory', 'mmap'):
+                    env['RECIPES_COMPACT'] = mode
+                d = run_child(env)
+                if baseline is None:
+                    baseline = d['before']
+                    print(f"{'-':>8} {'空进程':>8} {baseline['VmRSS']:>9} {baseline['RssAnon']:>9} "
+                          f"{baseline['RssFile']:>9} {'-':>9}")
+                w = d['worker']
+                print(f"{d['count']:>8} {mode:>9} {w['VmRSS']:>9} {w['RssAnon']:>9} {w['RssFile']:>9} "
+                      f"{d['preload']:>9}")
+
+
+if __name__ == '__main__':
+    main()
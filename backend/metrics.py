@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+轻量级监控指标（Prometheus 文本格式）
+
+- 计数器、直方图都在进程内累加，开销只是一次加锁和几次加法
+- 多个 gunicorn worker：设置 METRICS_DIR 后每个进程定期把自己的数据写到 METRICS_DIR/<pid>_<启动时间>.json，
+  /api/metrics 读取目录下所有文件求和，所以不管请求落到哪个 worker 都是全局数据；
+  已退出进程的文件在汇总时删除（Windows 上不做这一步），gunicorn master 启动时清空目录（见 gunicorn.conf.py）。
+  目录要每个部署单独一个，不要和压测脚本、其他实例共用
+- PROFILE_SLOW_MS > 0 时按 PROFILE_SAMPLE_RATE 的比例对请求做 cProfile，
+  耗时超过阈值的把 .prof 文件写到 PROFILE_DIR
+"""
+import cProfile
+import json
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, request
+
+# 直方图分桶（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HELP = {
+    "recipe_http_request_duration_seconds": ("histogram", "按路由统计的请求耗时"),
+    "recipe_stage_duration_seconds": ("histogram", "热点环节耗时：农历、推荐、搜索匹配、食材匹配、上游AI、响应编码"),
+    "recipe_cache_requests_total": ("counter", "各级缓存的命中/未命中次数"),
+    "recipe_upstream_requests_total": ("counter", "实际发往硅基流动API的请求数"),
+    "recipe_upstream_errors_total": ("counter", "硅基流动API错误数（按类型）"),
+    "recipe_slow_request_profiles_total": ("counter", "写出的慢请求 cProfile 文件数"),
+}
+
+
+def _process_alive(name):
+    """文件名 <pid>_<启动时间>.json 对应的进程是否还在"""
+    try:
+        pid = int(name.split('_', 1)[0])
+    except ValueError:
+        return False
+    if os.name == 'nt':
+        # Windows 上 os.kill(pid, 0) 会直接结束该进程；无法安全检查，一律当作还在
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # 进程存在，只是属于其他用户
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def clear_directory(directory):
+    """删除目录里的全部汇总文件；gunicorn master 启动时调用，避免计入上一次运行的数据"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            _remove(os.path.join(directory, name))
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    body = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + body + '}'
+
+
+class Metrics:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        # 多个线程同时 flush 时按顺序写，后写的一定是更新的数据
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._file = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _own_file(self):
+        # 文件名带上进程启动时间，pid 被复用时不会覆盖已退出 worker 的数据
+        if self._file is None or not self._file.startswith(os.path.join(self.directory, f"{os.getpid()}_")):
+            self._file = os.path.join(self.directory, f"{os.getpid()}_{int(time.time() * 1000)}.json")
+        return self._file
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+            idx = bisect_left(BUCKETS, seconds)
+            if idx < len(BUCKETS):
+                h[0][idx] += 1
+            h[1] += seconds
+            h[2] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, stage):
+        """记录一个环节的耗时到 recipe_stage_duration_seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("recipe_stage_duration_seconds", time.perf_counter() - started, stage=stage)
+
+    def cache(self, name, hit):
+        self.inc("recipe_cache_requests_total", cache=name, result="hit" if hit else "miss")
+
+    # --- 跨进程汇总 ---
+    def _dump(self):
+        with self._lock:
+            return {
+                "counters": [[n, list(map(list, l)), v] for (n, l), v in self._counters.items()],
+                "histograms": [[n, list(map(list, l)), list(h[0]), h[1], h[2]]
+                               for (n, l), h in self._histograms.items()],
+            }
+
+    def _maybe_flush(self):
+        if self.directory and time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+        self._last_flush = time.time()
+        with self._flush_lock:
+            path = self._own_file()
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(self._dump(), f)
+                os.replace(tmp, path)
+            except OSError as e:
+                print(f"写入监控数据失败: {e}")
+
+    def collect(self):
+        """返回 (counters, histograms)，多进程时为所有 worker 的和"""
+        dumps = []
+        if self.directory:
+            self.flush()
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.directory, name)
+                if not _process_alive(name):
+                    # 已退出的 worker：数据不再计入，文件顺手删掉
+                    _remove(path)
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        dumps.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        else:
+            dumps.append(self._dump())
+
+        counters, histograms = {}, {}
+        for d in dumps:
+            for n, labels, v in d["counters"]:
+                key = (n, tuple(map(tuple, labels)))
+                counters[key] = counters.get(key, 0) + v
+            for n, labels, buckets, total, count in d["histograms"]:
+                key = (n, tuple(map(tuple, labels)))
+                h = histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+                h[0] = [a + b for a, b in zip(h[0], buckets)]
+                h[1] += total
+                h[2] += count
+        return counters, histograms
+
+    def render(self, gauges=None):
+        """Prometheus 文本格式；gauges 为本进程的即时值 {name: (help, value)}"""
+        counters, histograms = self.collect()
+        lines = []
+        names = sorted({n for n, _ in counters} | {n for n, _ in histograms})
+        for name in names:
+            kind, help_text = HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (n, labels), (buckets, total, count) in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, c in zip(BUCKETS, buckets):
+                    cumulative += c
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+        for name, (help_text, value) in (gauges or {}).items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_app(app, metrics, profile_slow_ms=0, profile_rate=0.0, profile_dir=None):
+    """给每个请求计时；开启时对抽样到的慢请求写出 cProfile"""
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+        g._profiler = None
+        if profile_slow_ms > 0 and random.random() < profile_rate:
+            g._profiler = cProfile.Profile()
+            try:
+                g._profiler.enable()
+            except ValueError:
+                # 同一线程里已经有分析器在运行
+                g._profiler = None
+
+    @app.after_request
+    def _record(response):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe("recipe_http_request_duration_seconds", elapsed,
+                        route=route, method=request.method, status=response.status_code)
+
+        profiler = g.pop('_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            if elapsed * 1000 >= profile_slow_ms:
+                os.makedirs(profile_dir, exist_ok=True)
+                name = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+                path = os.path.join(profile_dir, f"{int(time.time())}_{name}_{int(elapsed * 1000)}ms_{os.getpid()}.prof")
+                profiler.dump_stats(path)
+                metrics.inc("recipe_slow_request_profiles_total", route=route)
+        return response
+
+
+def create_metrics():
+    """按环境变量创建
+
+    METRICS_DIR  多 worker 汇总用的目录，每个部署单独一个；默认不设置，只统计本进程
+    """
+    return Metrics(os.environ.get('METRICS_DIR') or None)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+菜谱数据快照与热加载
+
+一份 RecipeSnapshot = 菜谱列表 + 由它派生的全部索引，构建好之后只读。
+RecipeStore 持有当前快照，检测到 recipes.json 变化（mtime/inode 轮询或 SIGHUP）时
+在后台线程里解析、校验、建索引，然后一次赋值原子替换。
+请求处理开始时取一次 current()，整个请求都用同一份快照，不会看到新旧混合的数据。
+
+轮询线程和 SIGHUP 处理都属于进程，fork 后不会留在子进程里，所以 watch() 要在每个
+worker 里调用（同一进程重复调用不做事）。gunicorn 下各种组合：
+- 不加 --preload：每个 worker 自己导入并加载，轮询和 kill -HUP <worker pid> 都有效
+- 加 --preload：master 导入时加载一次，worker fork 后由 gunicorn.conf.py 的 post_worker_init
+  启动各自的轮询和 SIGHUP；master 里不轮询
+- 给 master 发 SIGHUP 是 gunicorn 的平滑重启：不加 --preload 时新 worker 重新读文件；
+  加 --preload 时新 worker 先拿到 master 启动时的数据，再由第一次轮询赶上
+- RECIPES_RELOAD_INTERVAL=0 关闭轮询，只能逐个给 worker 发 SIGHUP 或整体重启
+
+监听的是编译产物（.rcpc）时，同时检查它记录的源 JSON（meta.source）：源文件比产物新
+（部署后改过 recipes.json）就改用源 JSON，产物重新编译后再切回产物。
+"""
+import hashlib
+import json
+import os
+import signal
+import threading
+import time
+
+from search_index import SearchIndex
+from search_rank import SearchRanker
+from facet_index import FacetIndex
+from ingredient_index import IngredientIndex
+from compact_store import CompactRecipes, RecipeView, load_ragged, pack_ragged, write_compact_file
+
+# 编译产物（compile_recipes.py 生成的 .rcpc）里索引段的版本；索引结构变了就加一，旧产物会被拒绝
+ARTIFACT_VERSION = 2
+
+
+class RecipeValidationError(ValueError):
+    """recipes.json 内容不合法"""
+
+
+def encode_json(obj):
+    """与接口响应一致的紧凑 JSON 编码（键排序，中文不转义）"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def find_recipes_file(candidates):
+    """返回第一个存在的候选路径，都不存在时返回 None"""
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def default_recipe_paths(base_dir):
+    """app.py 默认的加载顺序：编译产物（RECIPES_ARTIFACT 可指定其他位置）在前，后面是 JSON 候选。
+    compile_recipes.py 用同一份列表，编译的就是没有产物时 app 会加载的那个 JSON"""
+    return [
+        os.environ.get('RECIPES_ARTIFACT', os.path.join(base_dir, 'data', 'recipes.rcpc')),
+        os.path.join(base_dir, 'recipes.json'),
+        os.path.join(base_dir, 'data', 'recipes.json'),
+        os.path.join(os.path.dirname(base_dir), 'recipes.json'),
+    ]
+
+
+def file_signature(path):
+    """用于判断文件是否变化：(inode, mtime_ns, size)"""
+    st = os.stat(path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def artifact_source(path):
+    """编译产物记录的源 JSON 路径；没有记录、文件不存在或产物读不出来时返回 None"""
+    try:
+        source = CompactRecipes.from_file(path).meta.get('source')
+    except (OSError, ValueError):
+        return None
+    source = source and os.path.normpath(os.path.join(os.path.dirname(path), source))
+    return source if source and os.path.exists(source) else None
+
+
+def validate_recipes(recipes):
+    if not isinstance(recipes, list):
+        raise RecipeValidationError("顶层必须是菜谱列表")
+    seen = set()
+    for i, r in enumerate(recipes):
+        if not isinstance(r, dict):
+            raise RecipeValidationError(f"第 {i} 项不是对象")
+        for field in ('id', 'name', 'category'):
+            if field not in r:
+                raise RecipeValidationError(f"第 {i} 项缺少字段 {field}")
+        for field in ('meal_type', 'ingredients'):
+            if not isinstance(r.get(field, []), list):
+                raise RecipeValidationError(f"第 {i} 项 {field} 必须是列表")
+        if r['id'] in seen:
+            raise RecipeValidationError(f"菜谱 id 重复: {r['id']}")
+        seen.add(r['id'])
+
+
+class RecipeSnapshot:
+    """一份只读的数据版本"""
+
+    def __init__(self, recipes, path=None, version='empty', signature=None, load_duration=0.0, sections=None):
+        self.recipes = recipes
+        self.path = path
+        self.version = version
+        self.signature = signature
+        self.loaded_at = time.time()
+        self.load_duration = load_duration
+        if sections is not None:
+            # 编译产物：索引和 JSON 片段都是预先算好的，直接引用 mmap 缓冲区
+            self.search_index = SearchIndex.from_sections(recipes, sections)
+            self.ranker = SearchRanker.from_sections(recipes, self.search_index, sections)
+            self.facet_index = FacetIndex.from_sections(recipes, sections)
+            self.ingredient_index = IngredientIndex.from_sections(recipes, sections)
+            self._fragments = load_ragged(sections, 'fragments')
+            return
+        # 派生索引
+        self.search_index = SearchIndex(recipes)
+        self.ranker = SearchRanker(recipes, self.search_index)
+        self.facet_index = FacetIndex(recipes)
+        self.ingredient_index = IngredientIndex(recipes)
+        # 每道菜预先编码好的 JSON 片段，拼接响应时直接使用；
+        # 紧凑存储为了省内存改为首次用到时编码
+        if isinstance(recipes, list):
+            self._fragments = [encode_json(r) for r in recipes]
+        else:
+            self._fragments = [None] * len(recipes)
+
+    def index_sections(self):
+        """写入编译产物的全部派生数据"""
+        return (self.search_index.to_sections() + self.ranker.to_sections() + self.facet_index.to_sections()
+                + self.ingredient_index.to_sections()
+                + pack_ragged('fragments', (self.fragment(i) for i in range(len(self.recipes))), 'B'))
+
+    def fragment(self, idx):
+        """第 idx 道菜的 JSON 字节"""
+        data = self._fragments[idx]
+        if isinstance(data, memoryview):
+            return bytes(data)
+        if data is None:
+            recipe = self.recipes[idx]
+            data = self._fragments[idx] = encode_json(
+                recipe.to_dict() if isinstance(recipe, RecipeView) else recipe)
+        return data
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "count": len(self.recipes),
+            "storage": type(self.recipes).__name__,
+            "loaded_at": self.loaded_at,
+            "load_duration_ms": round(self.load_duration * 1000, 1)
+        }
+
+
+def compact_recipes(recipes, path, version, mode):
+    """按 mode 把菜谱转成紧凑存储：
+    memory = 打包进进程内缓冲区（配合 gunicorn --preload 写时复制共享）
+    mmap   = 写成 <json路径>.<版本>.rcpc 后 mmap 打开，所有 worker 共享页缓存
+    """
+    if mode == 'mmap':
+        compact_path = f"{path}.{version}.rcpc"
+        if not os.path.exists(compact_path):
+            write_compact_file(recipes, compact_path, meta={"version": version})
+        return CompactRecipes.from_file(compact_path)
+    return CompactRecipes.from_recipes(recipes, meta={"version": version})
+
+
+def load_artifact(path):
+    """mmap 打开编译产物，不解析 JSON、不建索引，启动耗时与菜谱数量基本无关"""
+    started = time.perf_counter()
+    signature = file_signature(path)
+    recipes = CompactRecipes.from_file(path)
+    meta = recipes.meta
+    if meta.get('artifact') != ARTIFACT_VERSION:
+        raise ValueError(f"编译产物版本 {meta.get('artifact')} 与程序不一致（需要 {ARTIFACT_VERSION}），"
+                         f"请重新运行 compile_recipes.py")
+    snapshot = RecipeSnapshot(recipes, path=path, version=meta['version'], signature=signature,
+                              sections=recipes.sections)
+    snapshot.load_duration = time.perf_counter() - started
+    return snapshot
+
+
+def load_snapshot(path, compact=''):
+    """解析、校验并建好索引；出错时抛异常"""
+    if path.endswith('.rcpc'):
+        return load_artifact(path)
+    started = time.perf_counter()
+    signature = file_signature(path)
+    with open(path, 'rb') as f:
+        raw = f.read()
+    recipes = json.loads(raw.decode('utf-8'))
+    validate_recipes(recipes)
+    version = hashlib.sha1(raw).hexdigest()[:12]
+    if compact:
+        recipes = compact_recipes(recipes, path, version, compact)
+    snapshot = RecipeSnapshot(recipes, path=path, version=version, signature=signature)
+    snapshot.load_duration = time.perf_counter() - started
+    return snapshot
+
+
+class RecipeStore:
+    def __init__(self, candidates, compact=''):
+        self.candidates = candidates
+        self.compact = compact
+        self.path = None
+        self._failed_signature = None
+        self._reload_lock = threading.Lock()
+        self._watch_lock = threading.Lock()
+        self._watch_pid = None
+        self._source = (None, None)  # (产物签名, 源 JSON 路径)，产物不变就不必重新读 meta
+        self._snapshot = RecipeSnapshot([])
+        # 多路径尝试，第一个能成功加载的文件就是之后监听的文件
+        # 改用的源 JSON 读不出来时退回编译产物本身
+        for path in candidates:
+            if not os.path.exists(path):
+                continue
+            for target in dict.fromkeys((self.resolve(path), path)):
+                try:
+                    self._snapshot = self._load(path, target)
+                    self.path = path
+                    break
+                except Exception as e:
+                    print(f"读取 {target} 出错: {e}")
+            if self.path:
+                break
+
+    def current(self):
+        return self._snapshot
+
+    def _load(self, watched, path):
+        if path != watched:
+            print(f"注意: {path} 比编译产物 {watched} 新，改用 JSON；请重新运行 compile_recipes.py")
+        return load_snapshot(path, self.compact)
+
+    def resolve(self, path):
+        """实际要加载的文件：编译产物比它的源 JSON 旧时返回源 JSON，否则就是 path 本身"""
+        if not path.endswith('.rcpc'):
+            return path
+        signature = file_signature(path)
+        if self._source[0] != signature:
+            self._source = (signature, artifact_source(path))
+        source = self._source[1]
+        try:
+            if source and os.stat(source).st_mtime_ns > signature[1]:
+                return source
+        except OSError:
+            pass
+        return path
+
+    def reload(self, force=False):
+        """文件有变化（或 force）时重新加载；返回是否切换了快照。失败时保留旧数据。"""
+        with self._reload_lock:
+            watched = self.path or find_recipes_file(self.candidates)
+            if not watched:
+                return False
+            path = watched
+            try:
+                path = self.resolve(watched)
+                signature = file_signature(path)
+            except OSError as e:
+                print(f"检查 {path} 出错: {e}")
+                return False
+            old = self._snapshot
+            if not force and (path == old.path and signature == old.signature
+                              or signature == self._failed_signature):
+                return False
+            try:
+                snapshot = self._load(watched, path)
+            except Exception as e:
+                # 同一个坏文件只报一次错，文件再次变化后重试
+                self._failed_signature = signature
+                print(f"重新加载 {path} 失败，继续使用版本 {old.version}: {e}")
+                return False
+            self.path = watched
+            self._snapshot = snapshot
+            print(f"菜谱数据已更新: 版本 {snapshot.version}, {len(snapshot.recipes)} 道菜, "
+                  f"耗时 {snapshot.load_duration * 1000:.0f}ms")
+            return True
+
+    def watch(self, interval):
+        """在当前进程启动热加载：后台线程按 interval 秒轮询文件变化（<= 0 不轮询），并注册 SIGHUP。
+        每个进程只生效一次；fork 出来的子进程要自己再调用。"""
+        with self._watch_lock:
+            if self._watch_pid == os.getpid():
+                return
+            self._watch_pid = os.getpid()
+
+        def loop():
+            while True:
+                # 先检查一次：--preload 的 worker 拿到的是 fork 前的数据，文件可能已经变了
+                self.reload()
+                time.sleep(interval)
+        if interval > 0:
+            threading.Thread(target=loop, name='recipe-watcher', daemon=True).start()
+        self.install_sighup()
+
+    def install_sighup(self):
+        """收到 SIGHUP 时在后台线程里强制重新加载（仅主线程可注册）"""
+        if not hasattr(signal, 'SIGHUP'):
+            return
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(
+                target=self.reload, kwargs={"force": True}, daemon=True).start())
+        except ValueError:
+            pass
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+菜谱搜索倒排索引
+
+对菜名和食材建立 字符二元组(bigram) + 单字 + 整词 三类倒排表，
+查询时求倒排表交集得到候选，再用原来的子串判断做一次校验，
+保证结果与逐条 `keyword in ...` 扫描完全一致（包括顺序）。
+"""
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+from compact_store import PostingTable, pack_postings
+
+_TOKEN_SPLIT = re.compile(r'\s+')
+
+
+def _fields(recipe):
+    """参与搜索的文本字段：菜名 + 每一条食材"""
+    return [recipe.get('name', '')] + list(recipe.get('ingredients', []))
+
+
+def _grams(text):
+    """文本中所有的单字和相邻二元组"""
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _query_grams(keyword):
+    """查询词拆成二元组；单字查询直接用单字"""
+    if len(keyword) == 1:
+        return {keyword}
+    return {keyword[i:i + 2] for i in range(len(keyword) - 1)}
+
+
+class SearchIndex:
+    """按菜谱在列表中的下标建立的倒排索引（只读，构建后不再修改）"""
+
+    def __init__(self, recipes):
+        self.recipes = recipes
+        self.grams = {}
+        self.tokens = {}
+        for idx, recipe in enumerate(recipes):
+            seen_grams = set()
+            seen_tokens = set()
+            for text in _fields(recipe):
+                seen_grams |= _grams(text)
+                seen_tokens.update(t for t in _TOKEN_SPLIT.split(text) if t)
+            for g in seen_grams:
+                self.grams.setdefault(g, []).append(idx)
+            for t in seen_tokens:
+                self.tokens.setdefault(t, []).append(idx)
+
+    @classmethod
+    def from_sections(cls, recipes, sections):
+        """直接使用编译产物里的倒排表，不再扫描菜谱"""
+        index = cls.__new__(cls)
+        index.recipes = recipes
+        index.grams = PostingTable(sections, 'search:grams')
+        index.tokens = PostingTable(sections, 'search:tokens')
+        return index
+
+    def to_sections(self):
+        return pack_postings('search:grams', self.grams) + pack_postings('search:tokens', self.tokens)
+
+    def _matches(self, idx, keyword):
+        recipe = self.recipes[idx]
+        return (keyword in recipe.get('name', '') or
+                any(keyword in ing for ing in recipe.get('ingredients', [])))
+
+    def candidates(self, keyword):
+        """返回可能匹配的下标（已排序，未校验）"""
+        postings = []
+        for g in _query_grams(keyword):
+            plist = self.grams.get(g)
+            if not plist:
+                return []
+            postings.append(plist)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for plist in postings[1:]:
+            result.intersection_update(plist)
+            if not result:
+                return []
+        return sorted(result)
+
+    def iter_ids(self, keyword, after=-1):
+        """按原顺序逐个产出下标大于 after 的匹配菜谱，调用方拿够了即可停止"""
+        if not keyword:
+            yield from range(after + 1, len(self.recipes))
+            return
+        candidates = self.candidates(keyword)
+        start = bisect_right(candidates, after)
+        if len(keyword) <= 2:
+            # 单字/二元组本身就是某个字段的子串，倒排表即精确结果
+            yield from candidates[start:]
+            return
+        # 整词命中必然是子串，其余候选再逐条校验
+        exact = set(self.tokens.get(keyword, ()))
+        for i in candidates[start:]:
+            if i in exact or self._matches(i, keyword):
+                yield i
+
+    def search_ids(self, keyword):
+        """返回匹配菜谱的下标列表，顺序与原列表一致"""
+        return list(self.iter_ids(keyword))
+
+    def search(self, keyword):
+        """返回匹配的菜谱字典列表"""
+        return [self.recipes[i] for i in self.search_ids(keyword)]
+
+
+class SearchResultCache:
+    """(数据版本, 关键词) -> 完整匹配下标（或排好序的前若干个）的有界 LRU，翻页时直接切片"""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            ids = self._data.get(key)
+            if ids is not None:
+                self._data.move_to_end(key)
+            return ids
+
+    def put(self, key, ids):
+        ids = array('I', ids)
+        self._store(key, ids)
+        return ids
+
+    def put_ranked(self, key, ids, total, match_type):
+        """相关度排序的结果：只缓存已经排好的前若干个，以及匹配总数和匹配方式"""
+        entry = (array('I', ids), total, match_type)
+        self._store(key, entry)
+        return entry
+
+    def _store(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+if __name__ == '__main__':
+    # 简单基准：python search_index.py [菜谱数量]
+    import random
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    words = ['白菜', '萝卜', '土豆', '番茄', '黄瓜', '茄子', '豆角', '青椒', '猪肉', '牛肉',
+             '鸡蛋', '豆腐', '香菇', '木耳', '虾仁', '鸡胸肉', '小米', '红枣', '南瓜', '冬瓜']
+    cooks = ['炒', '炖', '蒸', '煮', '烧', '拌', '焖', '煎']
+    rng = random.Random(42)
+    corpus = []
+    for i in range(n):
+        main = rng.sample(words, 3)
+        corpus.append({
+            'id': i,
+            'name': f"{main[0]}{rng.choice(cooks)}{main[1]}{i}",
+            'ingredients': [f"{w} {rng.randint(1, 500)}g" for w in main],
+        })
+
+    t0 = time.perf_counter()
+    index = SearchIndex(corpus)
+    print(f"构建索引: {n} 道菜, {time.perf_counter() - t0:.2f}s")
+
+    for kw in ['鸡胸肉', '番茄', '炖牛', '红枣 1', '不存在的菜', f"萝卜{n - 1}"]:
+        expected = [r for r in corpus if kw in r['name'] or any(kw in x for x in r['ingredients'])]
+        t0 = time.perf_counter()
+        for _ in range(20):
+            got = index.search(kw)
+        per = (time.perf_counter() - t0) / 20 * 1000
+        t0 = time.perf_counter()
+        [r for r in corpus if kw in r['name'] or any(kw in x for x in r['ingredients'])]
+        scan = (time.perf_counter() - t0) * 1000
+        assert got == expected, kw
+        print(f"{kw!r:>14}: 命中 {len(got):>6}  索引 {per:8.3f}ms  线性扫描 {scan:8.3f}ms")
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+按相关度排序的搜索
+
+1. 精确：菜名 / 食材 / 标签 中包含关键词（多个词用空格分开时要求每个词都出现），
+   按 BM25F 打分：各字段词频按字段长度归一、乘以字段权重后再做饱和，乘以词的 idf；
+   菜名与关键词完全相同的额外加分
+2. 拼音：关键词全是字母时，匹配菜名全拼（hongshaorou）或首字母（hsr）
+3. 近似：以上都没有结果时，按有界编辑距离找菜名（西红市 -> 西红柿炒鸡蛋）
+只有三步都找不到时才需要调用 AI。打分只在匹配到的菜谱上进行，用堆取前 k 个，O(n log k)。
+"""
+import heapq
+import math
+from array import array
+
+from compact_store import NONE, CompactRecipes, PostingTable, load_ragged, pack_postings, pack_ragged
+from fuzzy_index import GramIndex, pinyin_keys
+
+# BM25 参数与字段权重
+K1 = 1.2
+B = 0.75
+FIELD_WEIGHTS = {'name': 3.0, 'ingredients': 1.0, 'tags': 1.5}
+EXACT_NAME_BONUS = 2.0
+
+MATCH_EXACT = 'exact'
+MATCH_PINYIN = 'pinyin'
+MATCH_FUZZY = 'fuzzy'
+
+
+def fuzzy_distance_for(query):
+    """允许的编辑距离：太短的词不做近似匹配"""
+    if len(query) < 3:
+        return 0
+    return 1 if len(query) <= 5 else 2
+
+
+class SearchRanker:
+    """依附于 SearchIndex 的排序器（只读）"""
+
+    def __init__(self, recipes, search_index):
+        self.recipes = recipes
+        self.search_index = search_index
+        names = {}
+        tags = {}
+        name_lengths = array('H')
+        ingredient_lengths = array('I')
+        for idx, recipe in enumerate(recipes):
+            name = recipe.get('name', '')
+            names.setdefault(name, []).append(idx)
+            for tag in set(recipe.get('tags', [])):
+                tags.setdefault(tag, []).append(idx)
+            name_lengths.append(min(len(name), 0xFFFF))
+            ingredient_lengths.append(sum(len(i) for i in recipe.get('ingredients', [])))
+        self.tags = tags
+        self.name_lengths = name_lengths
+        self.ingredient_lengths = ingredient_lengths
+        self.name_recipes = list(names.values())
+        self.names = GramIndex(names, n=1)
+
+        # 拼音按不重复的菜名计算，编号与 self.names 一致
+        keys = [pinyin_keys(name) for name in names]
+        if keys and keys[0] is not None:
+            self.pinyin = GramIndex([k[0] for k in keys], n=2)
+            self.initials = GramIndex([k[1] for k in keys], n=2)
+        else:
+            self.pinyin = self.initials = None
+        self._init_stats()
+
+    def _init_stats(self):
+        n = max(len(self.name_lengths), 1)
+        self.avg_name_length = max(sum(self.name_lengths) / n, 1.0)
+        self.avg_ingredient_length = max(sum(self.ingredient_lengths) / n, 1.0)
+
+    @classmethod
+    def from_sections(cls, recipes, search_index, sections):
+        ranker = cls.__new__(cls)
+        ranker.recipes = recipes
+        ranker.search_index = search_index
+        ranker.tags = PostingTable(sections, 'rank:tags')
+        ranker.name_lengths = sections['rank:name_lengths']
+        ranker.ingredient_lengths = sections['rank:ingredient_lengths']
+        ranker.name_recipes = load_ragged(sections, 'rank:name_recipes')
+        ranker.names = GramIndex.from_sections(sections, 'rank:names', n=1)
+        if 'rank:pinyin:grams:flat' in sections:
+            ranker.pinyin = GramIndex.from_sections(sections, 'rank:pinyin', n=2)
+            ranker.initials = GramIndex.from_sections(sections, 'rank:initials', n=2)
+        else:
+            ranker.pinyin = ranker.initials = None
+        ranker._init_stats()
+        return ranker
+
+    def to_sections(self):
+        sections = (pack_postings('rank:tags', self.tags)
+                    + [('rank:name_lengths', array('H', self.name_lengths)),
+                       ('rank:ingredient_lengths', array('I', self.ingredient_lengths))]
+                    + pack_ragged('rank:name_recipes', self.name_recipes)
+                    + self.names.to_sections('rank:names'))
+        if self.pinyin is not None:
+            sections += self.pinyin.to_sections('rank:pinyin') + self.initials.to_sections('rank:initials')
+        return sections
+
+    # --- 匹配 ---
+    def _term_ids(self, term):
+        """菜名 / 食材 / 标签 中包含 term 的菜谱下标"""
+        ids = set(self.search_index.iter_ids(term))
+        for tag, tag_ids in self.tags.items():
+            if term in tag:
+                ids.update(tag_ids)
+        return ids
+
+    # --- 打分 ---
+    def _scorer(self, terms, keyword):
+        """返回 下标 -> BM25F 分数 的函数；常量都提前绑定到局部变量，打分循环里只做计数"""
+        recipes = self.recipes
+        if isinstance(recipes, CompactRecipes) and len(terms) == 1:
+            return self._compact_scorer(terms[0], keyword)
+        name_lengths, ingredient_lengths = self.name_lengths, self.ingredient_lengths
+        name_scale = B / self.avg_name_length
+        ingredient_scale = B / self.avg_ingredient_length
+        w_name, w_ingredient, w_tag = FIELD_WEIGHTS['name'], FIELD_WEIGHTS['ingredients'], FIELD_WEIGHTS['tags']
+
+        def score(idx):
+            recipe = recipes[idx]
+            name = recipe.get('name', '')
+            # 用 \0 拼起来只数一次，关键词里不会有 \0，所以不会跨条目误算
+            ingredients = '\0'.join(recipe.get('ingredients', ()))
+            tags = '\0'.join(recipe.get('tags', ()))
+            name_norm = 1 - B + name_scale * name_lengths[idx]
+            ingredient_norm = 1 - B + ingredient_scale * ingredient_lengths[idx]
+            total = EXACT_NAME_BONUS if name == keyword else 0.0
+            for term, idf in terms:
+                tf = (w_name * name.count(term) / name_norm
+                      + w_ingredient * ingredients.count(term) / ingredient_norm
+                      + w_tag * tags.count(term))
+                total += idf * tf * (K1 + 1) / (tf + K1)
+            return total, -idx
+
+        return score
+
+    def _compact_scorer(self, term_idf, keyword):
+        """紧凑存储、单个词时的快速打分：字符串是去重的，"鸡蛋 2个" 这样的条目
+        在整个语料里只解码、计数一次，之后按编号查缓存"""
+        recipes = self.recipes
+        term, idf = term_idf
+        name_lengths, ingredient_lengths = self.name_lengths, self.ingredient_lengths
+        name_scale = B / self.avg_name_length
+        ingredient_scale = B / self.avg_ingredient_length
+        w_name, w_ingredient, w_tag = FIELD_WEIGHTS['name'], FIELD_WEIGHTS['ingredients'], FIELD_WEIGHTS['tags']
+        names = recipes.column('name')
+        ingredient_ids, ingredient_offsets = recipes.column('ingredients')
+        tag_ids, tag_offsets = recipes.column('tags')
+        string = recipes.string
+        memo = {NONE: 0}
+
+        def count(sid):
+            c = memo.get(sid)
+            if c is None:
+                c = memo[sid] = string(sid).count(term)
+            return c
+
+        def score(idx):
+            name_sid = names[idx]
+            ci = 0
+            for sid in ingredient_ids[ingredient_offsets[idx]:ingredient_offsets[idx + 1]]:
+                ci += memo[sid] if sid in memo else count(sid)
+            ct = 0
+            for sid in tag_ids[tag_offsets[idx]:tag_offsets[idx + 1]]:
+                ct += memo[sid] if sid in memo else count(sid)
+            tf = (w_name * count(name_sid) / (1 - B + name_scale * name_lengths[idx])
+                  + w_ingredient * ci / (1 - B + ingredient_scale * ingredient_lengths[idx])
+                  + w_tag * ct)
+            total = idf * tf * (K1 + 1) / (tf + K1)
+            if name_sid != NONE and string(name_sid) == keyword:
+                total += EXACT_NAME_BONUS
+            return total, -idx
+
+        return score
+
+    def rank(self, keyword, k):
+        """返回 (前 k 个下标, 匹配总数, 匹配方式)；匹配方式为 exact / pinyin / fuzzy，没有结果时为 None"""
+        n = len(self.recipes)
+        terms = keyword.split() or [keyword]
+        matched = None
+        weighted = []
+        for term in terms:
+            ids = self._term_ids(term)
+            matched = ids if matched is None else matched & ids
+            weighted.append((term, math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))))
+            if not matched:
+                break
+        if matched:
+            top = heapq.nlargest(k, matched, key=self._scorer(weighted, keyword))
+            return top, len(matched), MATCH_EXACT
+
+        query = ''.join(terms).lower()
+        if self.pinyin is not None and query.isascii() and query.isalpha() and len(query) >= 2:
+            top, total = self._rank_pinyin(query, k)
+            if total:
+                return top, total, MATCH_PINYIN
+
+        top, total = self._rank_fuzzy(''.join(terms), k)
+        if total:
+            return top, total, MATCH_FUZZY
+        return [], 0, None
+
+    def _rank_pinyin(self, query, k):
+        # 全拼完全相同 > 全拼开头 > 全拼包含 > 首字母包含；同级时菜名短的在前
+        scores = {}
+        for sid in self.initials.contains(query):
+            scores[sid] = 1
+        pinyin = self.pinyin.strings
+        for sid in self.pinyin.contains(query):
+            text = pinyin[sid]
+            scores[sid] = 4 if text == query else 3 if text.startswith(query) else 2
+        if not scores and len(query) >= 5:
+            for sid, dist in self.pinyin.near(query, 1 if len(query) < 10 else 2):
+                scores[sid] = -dist
+        return self._top_by_name(scores, k)
+
+    def _rank_fuzzy(self, query, k):
+        max_dist = fuzzy_distance_for(query)
+        if not max_dist:
+            return [], 0
+        scores = {sid: -dist for sid, dist in self.names.near(query, max_dist)}
+        return self._top_by_name(scores, k)
+
+    def _top_by_name(self, scores, k):
+        """scores 为 菜名编号 -> 分数，展开成菜谱下标后取前 k 个"""
+        if not scores:
+            return [], 0
+        best = {}
+        for sid, score in scores.items():
+            for idx in self.name_recipes[sid]:
+                best[idx] = score
+        lengths = self.name_lengths
+        top = heapq.nlargest(k, best, key=lambda i: (best[i], -lengths[i], -i))
+        return top, len(best)
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+硅基流动 API 客户端
+
+- requests.Session 长连接池，省掉每次请求的 TCP+TLS 握手
+- 连接/读取超时分开配置
+- 只在安全可重试的错误上重试（连接没建立、服务端明确拒绝处理），带随机抖动的退避
+- 熔断器：连续失败达到阈值后直接快速失败，冷却期后放行一个试探请求
+- AsyncSiliconFlowClient：ASGI 模式用的 httpx 异步版本，重试、超时、熔断规则相同
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError, ReadTimeoutError
+
+try:
+    import httpx
+except ImportError:  # 只有 ASGI 模式（asgi.py）需要
+    httpx = None
+
+DEFAULT_BASE_URL = "https://api.siliconflow.cn/v1"
+
+# 服务端没有处理请求就拒绝的状态码，重试是安全的
+RETRY_STATUS = {429, 503}
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """熔断器打开期间的快速失败"""
+
+
+def connect_failed(error):
+    """连接还没建立就失败了（连接超时、拒绝连接、DNS 解析失败），请求一定没有发出去。
+    requests 把请求发出后连接被断开（RemoteDisconnected、Connection aborted）也包装成 ConnectionError，
+    这时服务端可能已经在生成并计费，不能重试。"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.total_failures = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"硅基流动API连续失败 {self.failures} 次，熔断 {self.reset_timeout} 秒")
+                self.state = OPEN
+                self.opened_at = time.time()
+                self._trial_in_flight = False
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "total_failures": self.total_failures,
+                "rejected": self.rejected,
+                "opened_at": self.opened_at
+            }
+
+
+class SiliconFlowClient:
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, connect_timeout=5, read_timeout=30,
+                 max_retries=2, backoff=0.5, pool_size=10, breaker=None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.session = self._create_session(pool_size)
+
+    def _create_session(self, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _sleep_before_retry(self, attempt):
+        # 指数退避 + 全抖动
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def _post(self, path, payload, stream):
+        """发送请求，只在连接失败、429、503 时重试；返回 200 的响应或 None"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = self.session.post(url, json=payload, headers=headers,
+                                             timeout=self.timeout, stream=stream)
+            except requests.exceptions.ConnectionError as e:
+                # 只有连接阶段失败（请求没有到达服务端）才能安全重试
+                if last or not connect_failed(e):
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code == 200:
+                return response
+            response.close()
+            print(f"API调用失败: {response.status_code}")
+            if response.status_code in RETRY_STATUS and not last:
+                self._sleep_before_retry(attempt)
+                continue
+            return None
+
+    def chat(self, payload, on_token=None):
+        """调用 chat/completions，返回回复文本；失败返回 None，超时等网络异常向上抛出。
+        传入 on_token 时使用流式接口，每收到一段文字回调一次。"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("硅基流动API熔断中，暂不请求")
+
+        try:
+            if on_token is not None:
+                response = self._post("/chat/completions", dict(payload, stream=True), stream=True)
+                if response is None:
+                    content = None
+                else:
+                    with response:
+                        content = read_stream(response, on_token)
+            else:
+                response = self._post("/chat/completions", payload, stream=False)
+                content = response.json()['choices'][0]['message']['content'] if response is not None else None
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        if content is None:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return content
+
+    def status(self):
+        return {
+            "configured": bool(self.api_key),
+            "base_url": self.base_url,
+            "circuit": self.breaker.status()
+        }
+
+
+class AsyncSiliconFlowClient(SiliconFlowClient):
+    """httpx.AsyncClient 版本；breaker 可以与同步客户端共用，/api/health 看到的是同一个熔断器"""
+
+    def __init__(self, *args, pool_size=100, **kwargs):
+        # 等待上游不占线程，连接池可以比同步版大得多
+        super().__init__(*args, pool_size=pool_size, **kwargs)
+
+    def _create_session(self, pool_size):
+        if httpx is None:
+            raise RuntimeError("ASGI 模式需要安装 httpx")
+        connect_timeout, read_timeout = self.timeout
+        return httpx.AsyncClient(timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                                 limits=httpx.Limits(max_connections=pool_size,
+                                                     max_keepalive_connections=pool_size))
+
+    async def _post(self, path, payload, stream):
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        request = self.session.build_request("POST", f"{self.base_url}{path}", json=payload, headers=headers)
+        for attempt in range(self.max_retries + 1):
+            last = attempt == self.max_retries
+            try:
+                response = await self.session.send(request, stream=stream)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # 都是连接阶段的错误；发出请求后断开（RemoteProtocolError、ReadError）不重试
+                if last:
+                    raise
+                await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+                continue
+
+            if response.status_code == 200:
+                return response
+            await response.aclose()
+            print(f"API调用失败: {response.status_code}")
+            if response.status_code in RETRY_STATUS and not last:
+                await asyncio.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+                continue
+            return None
+
+    async def chat(self, payload, on_token=None):
+        if not self.breaker.allow():
+            raise CircuitOpenError("硅基流动API熔断中，暂不请求")
+
+        try:
+            if on_token is not None:
+                response = await self._post("/chat/completions", dict(payload, stream=True), stream=True)
+                if response is None:
+                    content = None
+                else:
+                    try:
+                        content = await read_stream_async(response, on_token)
+                    finally:
+                        await response.aclose()
+            else:
+                response = await self._post("/chat/completions", payload, stream=False)
+                content = response.json()['choices'][0]['message']['content'] if response is not None else None
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        if content is None:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return content
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+def parse_stream_line(line):
+    """SSE 的一行 -> (是否结束, 文字增量或 None)"""
+    if not line or not line.startswith('data:'):
+        return False, None
+    data = line[len('data:'):].strip()
+    if data == '[DONE]':
+        return True, None
+    return False, json.loads(data)['choices'][0].get('delta', {}).get('content')
+
+
+def read_stream(response, on_token):
+    """解析 OpenAI 兼容的 SSE 流，返回完整文本"""
+    response.encoding = 'utf-8'
+    parts = []
+    # chunk_size=None：按上游分块到达的节奏逐段读取，不攒满缓冲区
+    try:
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            done, delta = parse_stream_line(line)
+            if done:
+                break
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+    except requests.exceptions.ConnectionError as e:
+        # 读响应体时的超时被 requests 包装成 ConnectionError，还原成 ReadTimeout，与非流式调用一致
+        if e.args and isinstance(e.args[0], ReadTimeoutError):
+            raise requests.exceptions.ReadTimeout(e.args[0], request=e.request, response=response) from e
+        raise
+    return ''.join(parts) or None
+
+
+async def read_stream_async(response, on_token):
+    parts = []
+    async for line in response.aiter_lines():
+        done, delta = parse_stream_line(line)
+        if done:
+            break
+        if delta:
+            parts.append(delta)
+            on_token(delta)
+    return ''.join(parts) or None
+
+
+def create_client(client_class=SiliconFlowClient, breaker=None):
+    """按环境变量创建客户端；client_class 为 AsyncSiliconFlowClient 时是异步版本
+
+    SILICONFLOW_API_KEY          API Key
+    SILICONFLOW_BASE_URL         接口地址，测试时可指向本地桩服务
+    SILICONFLOW_CONNECT_TIMEOUT  连接超时（秒），默认 5
+    SILICONFLOW_READ_TIMEOUT     读取超时（秒），默认 30
+    SILICONFLOW_MAX_RETRIES      安全错误的最多重试次数，默认 2
+    SILICONFLOW_BREAKER_THRESHOLD / SILICONFLOW_BREAKER_RESET
+                                 连续失败多少次熔断（默认 5）、熔断多少秒（默认 30）
+    """
+    env = os.environ.get
+    if breaker is None:
+        breaker = CircuitBreaker(failure_threshold=int(env('SILICONFLOW_BREAKER_THRESHOLD', 5)),
+                                 reset_timeout=float(env('SILICONFLOW_BREAKER_RESET', 30)))
+    return client_class(api_key=env('SILICONFLOW_API_KEY', ''),
+                        base_url=env('SILICONFLOW_BASE_URL', DEFAULT_BASE_URL),
+                        connect_timeout=float(env('SILICONFLOW_CONNECT_TIMEOUT', 5)),
+                        read_timeout=float(env('SILICONFLOW_READ_TIMEOUT', 30)),
+                        max_retries=int(env('SILICONFLOW_MAX_RETRIES', 2)),
+                        breaker=breaker)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+前端静态资源：启动时加指纹、预压缩，之后全部从内存返回
+
+- frontend/static 下的每个文件按内容算 sha256，地址改成 static/css/style.<指纹>.css；
+  index.html 里的引用（连同手写的 ?v=3.1）换成带指纹的地址
+- 每个文件预先生成 gzip 版本（装了 brotli 时再生成 br），只保留比原文小的
+- 按 Accept-Encoding 选版本；带指纹的地址内容永远不变，缓存一年并标记 immutable，
+  index.html 和不带指纹的旧地址为 no-cache，每次用 ETag 协商
+- If-None-Match 命中时直接返回 304，不读磁盘、不压缩
+brotli 是可选依赖，没装时只有 gzip。
+frontend 目录或 index.html 不存在时（只部署后端）资源表为空、index 为 None，不影响 API。
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+try:
+    import brotli
+except ImportError:  # 可选依赖
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+# 太小的文件压缩省不了几个字节
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# 同时接受时优先 br
+ENCODINGS = ('br', 'gzip')
+
+_REFERENCE = re.compile(r'((?:href|src)=")/?static/([^"?#]+)(?:\?[^"#]*)?"')
+
+
+def _compress(body, mimetype):
+    variants = {}
+    if len(body) < MIN_COMPRESS_SIZE or not mimetype.startswith(COMPRESSIBLE):
+        return variants
+    variants['gzip'] = gzip.compress(body, 9, mtime=0)
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {enc: data for enc, data in variants.items() if len(data) < len(body)}
+
+
+class Asset:
+    """一个资源的原文和各压缩版本（只读）"""
+
+    def __init__(self, body, mimetype, cache_control=REVALIDATE):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.variants = {'identity': body}
+        self.variants.update(_compress(body, mimetype))
+        # 每个编码一个强 ETag：字节不同，ETag 也要不同
+        self.etags = {enc: self.digest[:16] + ('' if enc == 'identity' else '-' + enc) for enc in self.variants}
+
+    def with_cache_control(self, cache_control):
+        """同一份内容换一个缓存策略，压缩结果共用"""
+        asset = Asset.__new__(Asset)
+        asset.__dict__.update(self.__dict__)
+        asset.cache_control = cache_control
+        return asset
+
+    def negotiate(self, accept_encoding):
+        """accept_encoding 为 Accept-Encoding 请求头，返回选中的编码"""
+        accepted = parse_accept_header(accept_encoding)
+        for enc in ENCODINGS:
+            if enc in self.variants and accepted.quality(enc) > 0:
+                return enc
+        return 'identity'
+
+    def select(self, accept_encoding, if_none_match):
+        """按请求头选出 (状态码, 响应字节, 响应头)，不依赖具体的 Web 框架"""
+        encoding = self.negotiate(accept_encoding)
+        headers = {'ETag': quote_etag(self.etags[encoding]), 'Cache-Control': self.cache_control,
+                   'Vary': 'Accept-Encoding'}
+        # 浏览器换了编码再来协商时，拿着的可能是另一个版本的 ETag，内容相同，同样可以 304
+        etags = parse_etags(if_none_match)
+        if any(etags.contains(etag) for etag in self.etags.values()):
+            return 304, b'', headers
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        return 200, self.variants[encoding], headers
+
+    def response(self, request):
+        status, body, headers = self.select(request.headers.get('Accept-Encoding'),
+                                            request.headers.get('If-None-Match'))
+        if status == 304:
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype=self.mimetype, headers=headers)
+
+
+class StaticAssets:
+    """frontend 目录的内存副本：index + static/ 下的文件（带指纹和不带指纹两种地址）；
+    没有 index.html 时 index 为 None"""
+
+    def __init__(self, frontend_dir, fingerprint_length=10):
+        self.frontend_dir = frontend_dir
+        self.static_dir = os.path.join(frontend_dir, 'static')
+        self.files = {}
+        self.urls = {}  # 原路径 -> 带指纹的路径，都相对 static/
+        for root, _, names in os.walk(self.static_dir):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    body = f.read()
+                asset = Asset(body, mimetypes.guess_type(name)[0] or 'application/octet-stream')
+                stem, ext = os.path.splitext(rel)
+                fingerprinted = f'{stem}.{asset.digest[:fingerprint_length]}{ext}'
+                self.files[rel] = asset
+                self.files[fingerprinted] = asset.with_cache_control(IMMUTABLE)
+                self.urls[rel] = fingerprinted
+
+        self.index = None
+        index_path = os.path.join(frontend_dir, 'index.html')
+        if os.path.isfile(index_path):
+            with open(index_path, 'rb') as f:
+                html = f.read().decode('utf-8')
+            self.index = Asset(self.rewrite(html).encode('utf-8'), 'text/html')
+
+    def rewrite(self, html):
+        """把 index.html 里的 static/ 引用换成带指纹的地址；不认识的引用保持原样"""
+        def replace(match):
+            fingerprinted = self.urls.get(match.group(2))
+            if fingerprinted is None:
+                return match.group(0)
+            return f'{match.group(1)}static/{fingerprinted}"'
+        return _REFERENCE.sub(replace, html)
+
+    def get(self, path):
+        return self.files.get(path)
@@ -5,6 +5,7 @@ let currentDietType = '中餐'; // 当前饮食类型
 let currentData = null; // 当前推荐数据
 let currentSearchKeyword = ''; // 当前搜索关键词
 let currentSearchPage = 1; // 当前搜索页码
+let currentSearchCursor = null; // 下一页游标（由后端返回）
 let currentSearchData = null; // 当前搜索完整数据
 
 // 页面加载完成后初始化
@@ -225,6 +226,7 @@ async function performSearch() {
     // 重置搜索状态
     currentSearchKeyword = keyword;
     currentSearchPage = 1;
+    currentSearchCursor = null;
 
     // 显示搜索结果区域
     showSearchResults();
@@ -249,12 +251,14 @@ async function loadSearchResults(append = false) {
                 keyword: currentSearchKeyword,
                 type: 'auto',
                 page: currentSearchPage,
-                page_size: 3  // 每次加载3个
+                page_size: 3,  // 每次加载3个
+                cursor: append ? currentSearchCursor : null  // 有游标时从上一页末尾继续
             })
         });
 
         const data = await response.json();
         currentSearchData = data;
+        currentSearchCursor = data.pagination ? data.pagination.next_cursor : null;
         displaySearchResults(data, append);
     } catch (error) {
         console.error('搜索失败:', error);
@@ -282,7 +286,8 @@ function displaySearchResults(data, append = false) {
     if (!append) {
         const typeText = data.type === '蔬菜' ? '的做法' : '的不同做法';
         const totalInfo = data.pagination ? ` (共找到${data.pagination.total_count}个结果)` : '';
-        searchTitle.textContent = `"${data.keyword}"${typeText}${totalInfo}`;
+        const matchInfo = data.match_type === 'pinyin' ? ' (拼音匹配)' : data.match_type === 'fuzzy' ? ' (模糊匹配)' : '';
+        searchTitle.textContent = `"${data.keyword}"${typeText}${matchInfo}${totalInfo}`;
     }
 
     // 显示结果
@@ -305,9 +310,10 @@ function displaySearchResults(data, append = false) {
                             ${isTimeout ? '⚠️ ' : '💡 '}${data.api_response}
                         </p>
                     </div>
-                ` : '<p style="margin-top: 10px; color: #999;">请尝试其他关键词。</p>'}
+                ` : (data.ai_job ? '' : '<p style="margin-top: 10px; color: #999;">请尝试其他关键词。</p>')}
             </div>
         `;
+        if (data.ai_job) startAIJob(data.ai_job, data.keyword);
         return;
     }
 
@@ -346,10 +352,13 @@ function displaySearchResults(data, append = false) {
 
     // 如果有更多结果，显示"加载更多"按钮
     if (data.pagination && data.pagination.has_more) {
+        const remaining = data.pagination.total_count != null
+            ? ` (还有${data.pagination.total_count - data.pagination.current_page * data.pagination.page_size}个结果)`
+            : '';
         const loadMoreHTML = `
             <div style="text-align: center; margin: 30px 0;">
                 <button id="load-more-btn" class="btn" style="padding: 12px 40px; font-size: 16px;">
-                    加载更多 (还有${data.pagination.total_count - data.pagination.current_page * data.pagination.page_size}个结果)
+                    加载更多${remaining}
                 </button>
             </div>
         `;
@@ -373,6 +382,58 @@ function displaySearchResults(data, append = false) {
             </div>
         `);
     }
+
+    // AI结果在后台生成时，先占位再逐步显示
+    if (!append && data.ai_job) {
+        startAIJob(data.ai_job, data.keyword);
+    }
+}
+
+// 显示AI后台任务的占位卡片并开始轮询
+function startAIJob(job, keyword) {
+    const searchGrid = document.getElementById('search-grid');
+    searchGrid.insertAdjacentHTML('beforeend', `
+        <div class="recipe-detail-card" id="ai-job-card" style="background: #f0f8ff;">
+            <h3>💡 AI推荐的更多做法</h3>
+            <div id="ai-job-content" style="font-size: 17px; line-height: 1.8; white-space: pre-wrap; color: #999;">AI正在思考中...</div>
+        </div>
+    `);
+    pollAIJob(job, keyword);
+}
+
+// 轮询AI任务，把已生成的部分内容实时显示出来
+async function pollAIJob(job, keyword) {
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    // 用户换了关键词就停止轮询
+    while (currentSearchKeyword === keyword) {
+        await sleep(800);
+        const contentEl = document.getElementById('ai-job-content');
+        if (!contentEl) return;
+
+        try {
+            const response = await fetch(job.poll_url);
+            if (!response.ok) {
+                contentEl.textContent = 'AI暂时无法提供更多做法，请稍后再试。';
+                return;
+            }
+
+            const data = await response.json();
+            if (data.content) {
+                contentEl.style.color = '';
+                contentEl.textContent = data.content;
+            }
+
+            if (data.done) {
+                if (data.status === 'failed' && !data.content) {
+                    contentEl.textContent = 'AI暂时无法提供更多做法，请稍后再试。';
+                }
+                return;
+            }
+        } catch (error) {
+            console.error('获取AI结果失败:', error);
+        }
+    }
 }
 
 // 显示搜索结果区域